@@ -0,0 +1,248 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.optimize import OptimizeResult
+from MethodsForSolving import EnsembleResult, ThreeBodySolver
+from ResultStorage import prepare_output_dir, save_npz
+
+
+def _classify_chunk(init_states, mu, t_max, method, collision_radius, escape_radius):
+    """Исходы траекторий фрагмента в процессе-исполнителе"""
+    outcome = np.full(init_states.shape[0], BasinMap.FORBIDDEN, dtype=np.int8)
+    allowed = np.isfinite(init_states).all(axis=1)
+    if allowed.any():
+        result = ThreeBodySolver().solve_ensemble(
+            init_states[allowed], method, (0.0, t_max), [t_max], mu,
+            collision_radius=collision_radius, escape_radius=escape_radius)
+        outcome[allowed] = result.outcome
+    return outcome
+
+
+class BasinMap:
+    """Карта областей исходов с адаптивным измельчением (квадродерево)
+
+    Исход траектории (x₀, 0, 0, v₀): уход от тел, столкновение с M1,
+    столкновение с M2 или движение в ограниченной области до t_max.
+    Исходы вычисляются в вершинах ячеек. Начальная сетка base_size x base_size
+    ячеек делится рекурсивно, но только ячейки, вершины которых имеют
+    разные исходы, - то есть ячейки на границах областей. Вершины лежат в
+    узлах целочисленной решетки самого мелкого уровня, поэтому общие
+    вершины соседних ячеек считаются один раз.
+
+    Новые вершины каждого уровня решаются векторизованно фрагментами в пуле
+    процессов и сохраняются в файл уровня; прерванный расчет продолжается
+    с первого несохраненного уровня.
+    """
+
+    MANIFEST_NAME = 'basins.json'
+    LEVEL_NAME = 'level_{:02d}.npz'
+    CELLS_NAME = 'cells.npz'
+
+    # Коды исходов (совпадают с кодами EnsembleResult)
+    FAILED = EnsembleResult.FAILED
+    BOUNDED = EnsembleResult.COMPLETED
+    COLLISION_M1 = EnsembleResult.COLLISION_M1
+    COLLISION_M2 = EnsembleResult.COLLISION_M2
+    ESCAPE = EnsembleResult.ESCAPE
+    FORBIDDEN = 4
+
+    OUTCOME_NAMES = {
+        FAILED: 'ошибка',
+        BOUNDED: 'ограниченное движение',
+        COLLISION_M1: 'столкновение с M1',
+        COLLISION_M2: 'столкновение с M2',
+        ESCAPE: 'уход',
+        FORBIDDEN: 'запрещенная область'
+    }
+
+    def __init__(self, output_dir, mu, x0_range, second_range, kind='v0',
+                 base_size=16, max_level=6, t_max=50.0, method='DOP853',
+                 chunk_size=1024, collision_radius=1e-3, escape_radius=5.0):
+        """
+        Args:
+            x0_range: границы области по x₀
+            second_range: границы по v₀ (kind='v0') или по постоянной Якоби
+                C (kind='C', v₀ > 0 определяется по C)
+            base_size: число ячеек начальной сетки по каждой оси
+            max_level: число уровней измельчения; на самом мелком уровне
+                по оси base_size * 2^max_level ячеек
+        """
+        if kind not in ('v0', 'C'):
+            raise ValueError("Вторая ось карты должна быть 'v0' или 'C'")
+        self.output_dir = output_dir
+        self.mu = float(mu)
+        self.x0_range = tuple(float(value) for value in x0_range)
+        self.second_range = tuple(float(value) for value in second_range)
+        self.kind = kind
+        self.base_size = int(base_size)
+        self.max_level = int(max_level)
+        self.t_max = float(t_max)
+        self.method = method
+        self.chunk_size = int(chunk_size)
+        self.collision_radius = float(collision_radius)
+        self.escape_radius = float(escape_radius)
+
+    @property
+    def resolution(self):
+        """Число ячеек самого мелкого уровня по каждой оси"""
+        return self.base_size * 2 ** self.max_level
+
+    def manifest(self):
+        """Описание карты для проверки при возобновлении"""
+        return {
+            'mu': self.mu,
+            'x0_range': list(self.x0_range),
+            'second_range': list(self.second_range),
+            'kind': self.kind,
+            'base_size': self.base_size,
+            'max_level': self.max_level,
+            't_max': self.t_max,
+            'method': self.method,
+            'collision_radius': self.collision_radius,
+            'escape_radius': self.escape_radius
+        }
+
+    def init_states(self, i, j):
+        """Начальные условия для узлов решетки (i, j), форма (n, 4)"""
+        n = self.resolution
+        x0 = self.x0_range[0] + (self.x0_range[1] - self.x0_range[0]) * np.asarray(i) / n
+        second = (self.second_range[0]
+                  + (self.second_range[1] - self.second_range[0]) * np.asarray(j) / n)
+        if self.kind == 'v0':
+            v0 = second
+        else:
+            with np.errstate(invalid='ignore'):
+                v0 = np.sqrt(2 * ThreeBodySolver.effective_potential(x0, 0.0, self.mu)
+                             - second)
+        zeros = np.zeros(x0.size)
+        return np.column_stack([x0, zeros, zeros, v0])
+
+    def run(self, workers=None, progress=None):
+        """Запуск (или продолжение) построения карты
+
+        Args:
+            workers: число процессов, по умолчанию - все ядра
+            progress: функция progress(level, max_level, n_points),
+                вызываемая после каждого уровня
+
+        Returns:
+            число траекторий, решенных при этом запуске
+        """
+        prepare_output_dir(self.output_dir, self.MANIFEST_NAME, self.manifest())
+        outcomes = {}  # (i, j) -> исход
+        n_solved = 0
+
+        size = 2 ** self.max_level
+        cells = [(i * size, j * size) for i in range(self.base_size)
+                 for j in range(self.base_size)]
+        leaves = []  # (уровень, i, j, исход или -2 для неоднородной ячейки)
+
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            for level in range(self.max_level + 1):
+                size = 2 ** (self.max_level - level)
+                corners = {(i + di, j + dj) for i, j in cells
+                           for di in (0, size) for dj in (0, size)}
+                path = self._level_path(level)
+
+                if os.path.exists(path):
+                    with np.load(path) as data:
+                        outcomes.update(zip(zip(data['i'].tolist(), data['j'].tolist()),
+                                            data['outcome'].tolist()))
+                else:
+                    new = sorted(corners - outcomes.keys())
+                    i_new = np.array([p[0] for p in new], dtype=np.int64)
+                    j_new = np.array([p[1] for p in new], dtype=np.int64)
+                    outcome_new = self._classify(pool, i_new, j_new)
+                    outcomes.update(zip(new, outcome_new.tolist()))
+                    save_npz(path, i=i_new, j=j_new, outcome=outcome_new)
+                    n_solved += len(new)
+
+                # Ячейки с разными исходами в вершинах делятся на четыре
+                refined = []
+                for i, j in cells:
+                    values = {outcomes[(i + di, j + dj)] for di in (0, size) for dj in (0, size)}
+                    if len(values) == 1:
+                        leaves.append((level, i, j, values.pop()))
+                    elif level == self.max_level:
+                        leaves.append((level, i, j, -2))
+                    else:
+                        half = size // 2
+                        refined += [(i + di, j + dj) for di in (0, half) for dj in (0, half)]
+                cells = refined
+
+                if progress is not None:
+                    progress(level, self.max_level, len(outcomes))
+                if not cells:
+                    break
+
+        leaves = np.array(leaves, dtype=np.int64).reshape(-1, 4)
+        save_npz(os.path.join(self.output_dir, self.CELLS_NAME),
+                 level=leaves[:, 0], i=leaves[:, 1], j=leaves[:, 2],
+                 outcome=leaves[:, 3])
+        return n_solved
+
+    def load(self):
+        """Чтение построенной карты
+
+        Returns:
+            OptimizeResult с вершинами (i, j, outcome), листьями дерева
+            (cell_level, cell_i, cell_j, cell_outcome; -2 - неоднородная
+            ячейка самого мелкого уровня), числом решенных траекторий
+            n_points и числом узлов равномерной сетки того же разрешения
+            n_uniform
+        """
+        parts = {'i': [], 'j': [], 'outcome': []}
+        for level in range(self.max_level + 1):
+            path = self._level_path(level)
+            if not os.path.exists(path):
+                break
+            with np.load(path) as data:
+                for name in parts:
+                    parts[name].append(data[name])
+        points = {name: np.concatenate(values) if values else np.empty(0, dtype=np.int64)
+                  for name, values in parts.items()}
+
+        with np.load(os.path.join(self.output_dir, self.CELLS_NAME)) as data:
+            cells = {name: data[name] for name in ('level', 'i', 'j', 'outcome')}
+
+        return OptimizeResult(
+            mu=self.mu, kind=self.kind, x0_range=self.x0_range,
+            second_range=self.second_range, resolution=self.resolution,
+            max_level=self.max_level,
+            i=points['i'], j=points['j'], outcome=points['outcome'],
+            cell_level=cells['level'], cell_i=cells['i'], cell_j=cells['j'],
+            cell_outcome=cells['outcome'],
+            n_points=points['i'].size, n_uniform=(self.resolution + 1) ** 2
+        )
+
+    @staticmethod
+    def to_image(result):
+        """Растр исходов самого мелкого уровня, форма (resolution, resolution)
+
+        Неоднородные ячейки самого мелкого уровня получают исход своей
+        левой нижней вершины.
+        """
+        n = result.resolution
+        image = np.full((n, n), BasinMap.FAILED, dtype=np.int8)
+        corner = dict(zip(zip(result.i.tolist(), result.j.tolist()), result.outcome.tolist()))
+        for level, i, j, outcome in zip(result.cell_level.tolist(), result.cell_i.tolist(),
+                                        result.cell_j.tolist(), result.cell_outcome.tolist()):
+            size = 2 ** (result.max_level - level)
+            if outcome == -2:
+                outcome = corner[(i, j)]
+            image[j:j + size, i:i + size] = outcome
+        return image
+
+    def _classify(self, pool, i, j):
+        """Исходы для узлов решетки, решаемые фрагментами в пуле процессов"""
+        init_states = self.init_states(i, j)
+        futures = [pool.submit(_classify_chunk, init_states[start:start + self.chunk_size],
+                               self.mu, self.t_max, self.method, self.collision_radius,
+                               self.escape_radius)
+                   for start in range(0, len(init_states), self.chunk_size)]
+        parts = [future.result() for future in futures]
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int8)
+
+    def _level_path(self, level):
+        return os.path.join(self.output_dir, self.LEVEL_NAME.format(level))
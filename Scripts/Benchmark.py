@@ -0,0 +1,340 @@
+"""Замеры производительности основных вычислений без графического интерфейса
+
+Примеры:
+    python Benchmark.py                          # замер и сравнение с базой
+    python Benchmark.py --save-baseline          # замер и сохранение базы
+    python Benchmark.py --only solve --repeat 5 -o results.json
+    python Benchmark.py --time-threshold 1.5 --baseline ci_baseline.json
+
+Для каждого замера записываются время (медиана --repeat повторов; база
+сохраняется не менее чем по BASELINE_REPEAT повторам),
+число вычислений правой части, пиковая память (tracemalloc, отдельный
+прогон) и точность: дрейф постоянной Якоби и отклонение конечного
+состояния от эталонного решения DOP853 с допусками 1e-13.
+
+Результаты сравниваются с файлом базы; превышение порогов считается
+регрессией, и программа завершается с кодом 1. Окно графика создается с
+платформой Qt offscreen.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+from MethodsForSolving import ThreeBodySolver, _lagrange_points_cached
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'benchmark_baseline.json')
+
+# Сценарии: быстрые настройки главного окна и орбиты с тесным сближением
+SCENARIOS = {
+    'earth_moon': {'mu': 0.01215, 'init_states': [0.65, 0.0, 0.0, 2.07], 't_max': 30.0},
+    'sun_jupiter': {'mu': 0.0009537, 'init_states': [0.65, 0.0, 0.0, 2.07], 't_max': 30.0},
+    'equal_mass': {'mu': 0.5, 'init_states': [0.65, 0.0, 0.0, 2.07], 't_max': 30.0},
+    'near_collision_moon': {'mu': 0.01215, 'init_states': [0.88785, 0.0, 0.0, 0.15],
+                            't_max': 10.0},
+    'near_collision_equal': {'mu': 0.5, 'init_states': [0.3, 0.0, 0.0, 0.1], 't_max': 10.0},
+}
+
+METHODS = ('RK45', 'DOP853', 'LSODA')
+N_POINTS = 20000
+
+# Пороги регрессии: отношение нового значения к базовому. Время на общей
+# (виртуальной) машине меняется между запусками в 1.5-1.7 раза, поэтому
+# порог по времени широкий; точные счетчики nfev и память проверяются
+# строго. На выделенной машине порог можно сузить (--time-threshold 1.25)
+THRESHOLDS = {
+    'time': 2.0,
+    'nfev': 1.05,
+    'peak_memory': 1.25,
+    'accuracy': 10.0,
+}
+
+# Погрешности меньше этой считаются совпадающими с базой
+ACCURACY_FLOOR = 1e-12
+
+# Допуск по времени сверх порога, с: у замеров короче ~20 мс разброс между
+# запусками сравним с самим временем, и одного отношения к базе мало
+TIME_SLACK = 0.005
+
+# Наименьшее число повторов при сохранении базы
+BASELINE_REPEAT = 5
+
+
+def measure(func, repeat):
+    """Медиана времени repeat запусков и пиковая память отдельного запуска
+
+    Returns:
+        (результат последнего запуска, время в секундах, пик памяти в байтах)
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, float(np.median(times)), peak
+
+
+def scenario_run(name, method='RK45'):
+    """Аргументы solve_system для сценария"""
+    scenario = SCENARIOS[name]
+    t_max = scenario['t_max']
+    return (scenario['init_states'], method, (0.0, t_max),
+            np.linspace(0.0, t_max, N_POINTS), scenario['mu'])
+
+
+def reference_state(name):
+    """Эталонное конечное состояние сценария"""
+    init_states, _, t_span, _, mu = scenario_run(name)
+    sol = ThreeBodySolver().solve_system(init_states, 'DOP853', t_span, [t_span[1]], mu,
+                                         rtol=1e-13, atol=1e-13)
+    return sol.y[:, -1]
+
+
+def bench_equations(repeat):
+    """Одно вычисление правой части (время на вызов)"""
+    state = np.array(SCENARIOS['earth_moon']['init_states'])
+    mu = SCENARIOS['earth_moon']['mu']
+    calls = 10000
+
+    def run():
+        for _ in range(calls):
+            ThreeBodySolver.equations(0.0, state, mu)
+
+    _, elapsed, peak = measure(run, repeat)
+    return {'equations': {'time': elapsed / calls, 'peak_memory': peak}}
+
+
+def bench_solve_system(repeat):
+    """solve_system для всех сценариев и методов"""
+    solver = ThreeBodySolver()
+    records = {}
+    for name in SCENARIOS:
+        reference = reference_state(name)
+        for method in METHODS:
+            run = scenario_run(name, method)
+            sol, elapsed, peak = measure(lambda: solver.solve_system(*run), repeat)
+            records[f'solve_system/{method}/{name}'] = {
+                'time': elapsed,
+                'nfev': int(sol.nfev),
+                'njev': int(sol.njev),
+                'peak_memory': peak,
+                'jacobi_drift': float(sol.jacobi.max_drift),
+                'error': float(np.abs(sol.y[:, -1] - reference).max()),
+                'success': bool(sol.success),
+            }
+    return records
+
+
+def bench_lagrange(repeat):
+    """Точки Лагранжа без кэша: по одному μ и векторно для 1000 значений μ"""
+    mu_values = sorted({scenario['mu'] for scenario in SCENARIOS.values()})
+
+    def run_simple():
+        _lagrange_points_cached.cache_clear()
+        return [ThreeBodySolver.get_lagrange_points_simple(mu) for mu in mu_values]
+
+    points, elapsed, peak = measure(run_simple, repeat)
+    # Точность: остаток уравнения ∂Ω/∂x = 0 в найденных точках
+    residual = max(abs(ThreeBodySolver.equations(0.0, [x, 0.0, 0.0, 0.0], mu)[2])
+                   for mu, xs in zip(mu_values, points) for x in xs)
+    records = {'lagrange/simple': {'time': elapsed, 'peak_memory': peak,
+                                   'error': float(residual)}}
+
+    mu_grid = np.linspace(1e-6, 0.5, 1000)
+    _, elapsed, peak = measure(lambda: ThreeBodySolver.lagrange_points(mu_grid), repeat)
+    records['lagrange/vectorized'] = {'time': elapsed, 'peak_memory': peak}
+    return records
+
+
+def bench_decimation(repeat):
+    """Прореживание траектории: вся область и увеличение между отсчетами
+
+    При увеличении окно меньше промежутка между соседними отсчетами
+    ставится на середину самого длинного отрезка; отрезок должен остаться
+    видимым (success).
+    """
+    from Decimation import decimate_path, view_geometry
+
+    sol = ThreeBodySolver().solve_system(*scenario_run('equal_mass'))
+    x, y = sol.y[0], sol.y[1]
+    records = {}
+
+    x_range, y_range, pixel_size = view_geometry((0.0, 0.0), (5.0, 5.0), 800, 600)
+    _, elapsed, peak = measure(lambda: decimate_path(x, y, x_range, y_range, pixel_size),
+                               repeat)
+    records['decimation/full_view'] = {'time': elapsed, 'peak_memory': peak}
+
+    gaps = np.hypot(np.diff(x), np.diff(y))
+    i = int(gaps.argmax())
+    center = ((x[i] + x[i + 1]) / 2, (y[i] + y[i + 1]) / 2)
+    bound = gaps[i] / 4
+    x_range, y_range, pixel_size = view_geometry(center, (bound, bound), 800, 600)
+    (xs, _), elapsed, peak = measure(
+        lambda: decimate_path(x, y, x_range, y_range, pixel_size), repeat)
+    records['decimation/zoom_between_samples'] = {
+        'time': elapsed, 'peak_memory': peak,
+        'success': bool(np.isin(x[i:i + 2], xs).all()),
+        'message': "отрезок между отсчетами не виден при увеличении"}
+    return records
+
+
+def bench_plot_orbit(repeat):
+    """plot_orbit (с отрисовкой холста) для всех сценариев"""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    from PlotWindow import OrbitPlotWindow
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+    window = OrbitPlotWindow()
+    solver = ThreeBodySolver()
+    records = {}
+    for name in SCENARIOS:
+        run = scenario_run(name)
+        sol = solver.solve_system(*run)
+        init_states, method, _, _, mu = run
+        _, elapsed, peak = measure(
+            lambda: window.plot_orbit(sol, mu, init_states, method), repeat)
+        records[f'plot_orbit/{name}'] = {'time': elapsed, 'peak_memory': peak}
+    window.close()
+    app.processEvents()
+    return records
+
+
+BENCHMARKS = {
+    'equations': bench_equations,
+    'solve_system': bench_solve_system,
+    'lagrange': bench_lagrange,
+    'decimation': bench_decimation,
+    'plot_orbit': bench_plot_orbit,
+}
+
+
+def run_suite(repeat=3, only=None):
+    """Запуск замеров; only - список имен групп из BENCHMARKS"""
+    results = {}
+    for group, bench in BENCHMARKS.items():
+        if only and group not in only:
+            continue
+        print(f"Замер: {group}", file=sys.stderr)
+        results.update(bench(repeat))
+    return results
+
+
+def environment():
+    """Описание окружения, в котором сделаны замеры"""
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'scipy': scipy.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+    }
+
+
+def compare(results, baseline, thresholds):
+    """Сравнение с базой
+
+    Returns:
+        список строк с описанием регрессий
+    """
+    regressions = []
+    for name, record in results.items():
+        base = baseline.get(name)
+        if not record.get('success', True) and (base is None or base.get('success', True)):
+            regressions.append(f"{name}: {record.get('message', 'решение завершилось неудачей')}")
+        if base is None:
+            continue
+        for key in ('time', 'nfev', 'peak_memory'):
+            if key in record and base.get(key):
+                ratio = record[key] / base[key]
+                slack = TIME_SLACK if key == 'time' else 0.0
+                if record[key] > base[key] * thresholds[key] + slack:
+                    regressions.append(f"{name}: {key} {base[key]:.4g} -> {record[key]:.4g} "
+                                       f"(x{ratio:.2f} > x{thresholds[key]:g})")
+        for key in ('jacobi_drift', 'error'):
+            if key in record and key in base:
+                limit = max(base[key], ACCURACY_FLOOR) * thresholds['accuracy']
+                if record[key] > limit:
+                    regressions.append(f"{name}: {key} {base[key]:.3e} -> {record[key]:.3e}")
+    return regressions
+
+
+def print_table(results, baseline):
+    """Таблица результатов с отношением времени к базе"""
+    print(f"{'замер':<40} {'время, с':>11} {'к базе':>7} {'nfev':>7} "
+          f"{'память, КБ':>11} {'дрейф C':>9} {'ошибка':>9}")
+    for name, record in results.items():
+        base = baseline.get(name, {})
+        ratio = f"x{record['time'] / base['time']:.2f}" if base.get('time') else '-'
+        drift = f"{record['jacobi_drift']:.1e}" if 'jacobi_drift' in record else '-'
+        error = f"{record['error']:.1e}" if 'error' in record else '-'
+        print(f"{name:<40} {record['time']:>11.4g} {ratio:>7} {record.get('nfev', '-'):>7} "
+              f"{record['peak_memory'] / 1024:>11.0f} {drift:>9} {error:>9}")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Замеры производительности решателя, точек Лагранжа и графиков")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="файл базы .json")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="сохранить результаты как новую базу")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS),
+                        help="запустить только указанные группы")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help=f"число повторов замера (для базы не меньше {BASELINE_REPEAT})")
+    parser.add_argument('-o', '--output', help="сохранить результаты в .json")
+    for key, value in THRESHOLDS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}-threshold", type=float, default=value,
+                            dest=f'{key}_threshold',
+                            help=f"допустимое отношение к базе (по умолчанию {value:g})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    repeat = max(args.repeat, BASELINE_REPEAT) if args.save_baseline else args.repeat
+    results = run_suite(repeat, args.only)
+    report = {'environment': environment(), 'results': results}
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+
+    print_table(results, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"База сохранена: {args.baseline}", file=sys.stderr)
+        return 0
+    if not baseline:
+        print(f"Файл базы {args.baseline} не найден; сравнение пропущено", file=sys.stderr)
+        return 0
+
+    thresholds = {key: getattr(args, f'{key}_threshold') for key in THRESHOLDS}
+    regressions = compare(results, baseline, thresholds)
+    for line in regressions:
+        print(f"Регрессия: {line}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
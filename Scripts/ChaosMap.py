@@ -0,0 +1,292 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from scipy.optimize import OptimizeResult
+from MethodsForSolving import ThreeBodySolver, integrate_lanes
+from ResultStorage import prepare_output_dir, save_npz
+
+
+def _extended_equations(t, z, mu):
+    """Уравнения движения, уравнения в вариациях и интегралы MEGNO
+
+    z формы (10, N): x, y, u, v, вектор вариаций δ (4 компоненты),
+    I = ∫ (δ̇·δ / δ·δ) s ds и J = ∫ 2I/s ds. Тогда MEGNO Y = 2I/t,
+    его среднее Ȳ = J/t. Оба интеграла не зависят от нормировки δ.
+    """
+    out = np.empty_like(z)
+    out[:8] = ThreeBodySolver.variational_ensemble(t, z[:8], mu)
+    dx, dy, du, dv = z[4:8]
+
+    rate = (dx * out[4] + dy * out[5] + du * out[6] + dv * out[7]) / \
+        (dx * dx + dy * dy + du * du + dv * dv)
+    out[8] = rate * t
+    # При t = 0 интеграл I тоже равен нулю
+    out[9] = 2.0 * z[8] / np.maximum(t, np.finfo(float).tiny)
+    return out
+
+
+def chaos_indicators(init_states, mu, t_max, method='DOP853', rtol=1e-9, atol=1e-12,
+                     collision_radius=1e-3, escape_radius=5.0):
+    """FLI и MEGNO для набора начальных условий
+
+    Все траектории интегрируются одновременно с собственным шагом для
+    каждой траектории (см. integrate_lanes). Вектор
+    вариаций после каждого шага нормируется, а логарифм его длины
+    накапливается отдельно, поэтому переполнения не возникает при любом t_max.
+
+    Args:
+        init_states: массив формы (N, 4)
+        mu: массовый параметр, скаляр или массив длины N
+
+    Returns:
+        (fli, megno, status): FLI = max log₁₀|δ(t)|, среднее MEGNO Ȳ(t) в
+        момент остановки и код завершения (см. ChaosMap.COMPLETED и др.)
+    """
+    init_states = np.atleast_2d(np.asarray(init_states, dtype=float))
+    n = init_states.shape[0]
+    mu = np.broadcast_to(np.asarray(mu, dtype=float), (n,)).copy()
+
+    fli = np.full(n, np.nan)
+    megno = np.full(n, np.nan)
+    status = np.full(n, ChaosMap.FAILED, dtype=np.int8)
+    log_norm = np.zeros(n)
+    max_log_norm = np.zeros(n)
+
+    z0 = np.zeros((10, n))
+    z0[:4] = init_states.T
+    z0[4:8] = 0.5  # единичный начальный вектор вариаций
+
+    def on_step(step):
+        accepted, idx = step.accepted, step.idx
+        mu_act, = step.args
+
+        # Нормировка вектора вариаций; правая часть для δ линейна по δ
+        length = np.sqrt(np.sum(step.y_new[4:8] ** 2, axis=0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_norm[idx] = np.where(accepted, log_norm[idx] + np.log(length), log_norm[idx])
+            step.y_new[4:8] /= length
+            step.f_new[4:8] /= length
+        max_log_norm[idx] = np.maximum(max_log_norm[idx], log_norm[idx])
+
+        t = np.where(accepted, step.t_new, step.t)
+        z = np.where(accepted, step.y_new, step.y)
+        r_sq = z[0] ** 2 + z[1] ** 2
+        dx1 = z[0] + mu_act
+        r1_sq = dx1 * dx1 + z[1] ** 2
+        r2_sq = (dx1 - 1.0) ** 2 + z[1] ** 2
+        done = {
+            ChaosMap.COMPLETED: step.finished,
+            ChaosMap.COLLISION: np.minimum(r1_sq, r2_sq) < collision_radius ** 2,
+            ChaosMap.ESCAPE: r_sq > escape_radius ** 2,
+            ChaosMap.FAILED: step.broken | step.too_small
+        }
+        stop = np.zeros(idx.size, dtype=bool)
+        for code, mask in done.items():
+            mask = mask & ~stop
+            if mask.any():
+                lanes = idx[mask]
+                status[lanes] = code
+                fli[lanes] = max_log_norm[lanes] / np.log(10)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    megno[lanes] = np.where(t[mask] > 0, z[9, mask] / t[mask], np.nan)
+                stop |= mask
+        return stop
+
+    integrate_lanes(_extended_equations, z0, (0.0, t_max),
+                    ThreeBodySolver.ENSEMBLE_METHODS[method], rtol, atol, on_step,
+                    args=(mu,))
+    return fli, megno, status
+
+
+def _run_chunk(output_dir, index, init_states, mu, t_max, method, rtol, atol,
+               collision_radius, escape_radius):
+    """Расчет одного фрагмента карты в процессе-исполнителе"""
+    n = init_states.shape[0]
+    fli = np.full(n, np.nan)
+    megno = np.full(n, np.nan)
+    status = np.full(n, ChaosMap.FORBIDDEN, dtype=np.int8)
+
+    allowed = np.isfinite(init_states).all(axis=1)
+    if allowed.any():
+        fli[allowed], megno[allowed], status[allowed] = chaos_indicators(
+            init_states[allowed], mu, t_max, method, rtol, atol, collision_radius,
+            escape_radius)
+
+    save_npz(os.path.join(output_dir, ChaosMap.CHUNK_NAME.format(index)),
+             fli=fli, megno=megno, status=status)
+    return index
+
+
+class ChaosMap:
+    """Карта индикаторов хаоса FLI и MEGNO на сетке начальных условий
+
+    Начальные условия (x₀, 0, 0, v₀) задаются сеткой по x₀ и либо v₀
+    (kind='v0'), либо постоянной Якоби C (kind='C', тогда v₀ > 0
+    определяется по C; узлы в запрещенной области пропускаются).
+    Сетка делится на фрагменты по chunk_size траекторий, которые считаются
+    векторизованно в пуле процессов и сохраняются в отдельные файлы,
+    поэтому прерванный расчет продолжается с несохраненных фрагментов.
+    """
+
+    MANIFEST_NAME = 'chaos_map.json'
+    CHUNK_NAME = 'chunk_{:06d}.npz'
+
+    # Коды завершения траекторий
+    COMPLETED = 0
+    COLLISION = 1
+    ESCAPE = 2
+    FAILED = 3
+    FORBIDDEN = 4
+
+    def __init__(self, output_dir, mu, x0_values, second_values, **options):
+        self.output_dir = output_dir
+        for name, value in self.parameters(mu, x0_values, second_values,
+                                           **options).items():
+            setattr(self, name, value)
+
+    @staticmethod
+    def parameters(mu, x0_values, second_values, kind='v0', t_max=100.0,
+                   method='DOP853', chunk_size=2048, rtol=1e-9, atol=1e-12,
+                   collision_radius=1e-3, escape_radius=5.0):
+        """Параметры карты в приведенном виде (аргументы конструктора)"""
+        if kind not in ('v0', 'C'):
+            raise ValueError("Вторая ось карты должна быть 'v0' или 'C'")
+        return {
+            'mu': float(mu),
+            'x0_values': np.atleast_1d(np.asarray(x0_values, dtype=float)),
+            'second_values': np.atleast_1d(np.asarray(second_values, dtype=float)),
+            'kind': kind,
+            't_max': float(t_max),
+            'method': method,
+            'chunk_size': int(chunk_size),
+            'rtol': rtol,
+            'atol': atol,
+            'collision_radius': float(collision_radius),
+            'escape_radius': float(escape_radius)
+        }
+
+    @property
+    def shape(self):
+        """Форма карты: (число значений второй оси, число значений x₀)"""
+        return self.second_values.size, self.x0_values.size
+
+    @property
+    def size(self):
+        return self.second_values.size * self.x0_values.size
+
+    @property
+    def n_chunks(self):
+        return -(-self.size // self.chunk_size)
+
+    def grid(self):
+        """Начальные условия всех узлов карты построчно, форма (size, 4)"""
+        x0, second = np.meshgrid(self.x0_values, self.second_values)
+        x0, second = x0.ravel(), second.ravel()
+        if self.kind == 'v0':
+            v0 = second
+        else:
+            with np.errstate(invalid='ignore'):
+                v0 = np.sqrt(2 * ThreeBodySolver.effective_potential(x0, 0.0, self.mu)
+                             - second)
+        zeros = np.zeros(x0.size)
+        return np.column_stack([x0, zeros, zeros, v0])
+
+    def manifest(self):
+        """Описание карты для проверки при возобновлении"""
+        return self._describe(vars(self))
+
+    @staticmethod
+    def digest(mu, x0_values, second_values, **options):
+        """Идентификатор карты по параметрам конструктора (имя каталога для кэша)"""
+        manifest = ChaosMap._describe(
+            ChaosMap.parameters(mu, x0_values, second_values, **options))
+        text = json.dumps(manifest, sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def _describe(parameters):
+        return {
+            name: value.tolist() if isinstance(value, np.ndarray) else value
+            for name, value in parameters.items() if name != 'output_dir'
+        }
+
+    def pending_chunks(self):
+        """Номера фрагментов, результаты которых еще не сохранены"""
+        return [i for i in range(self.n_chunks)
+                if not os.path.exists(self._chunk_path(i))]
+
+    def run(self, workers=None, progress=None):
+        """Запуск (или продолжение) расчета карты
+
+        Args:
+            workers: число процессов, по умолчанию - все ядра
+            progress: функция progress(done, total), вызываемая после
+                сохранения каждого фрагмента
+
+        Returns:
+            число фрагментов, рассчитанных при этом запуске
+        """
+        prepare_output_dir(self.output_dir, self.MANIFEST_NAME, self.manifest())
+        pending = self.pending_chunks()
+        done = self.n_chunks - len(pending)
+        if not pending:
+            return 0
+
+        init_states = self.grid()
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = []
+            for index in pending:
+                part = slice(index * self.chunk_size, (index + 1) * self.chunk_size)
+                futures.append(pool.submit(
+                    _run_chunk, self.output_dir, index, init_states[part], self.mu,
+                    self.t_max, self.method, self.rtol, self.atol, self.collision_radius,
+                    self.escape_radius
+                ))
+
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    done += 1
+                    if progress is not None:
+                        progress(done, self.n_chunks)
+            except BaseException:
+                # Прерывание (в том числе из progress): ожидающие фрагменты
+                # снимаются, дожидаться приходится только уже начатых
+                pool.shutdown(cancel_futures=True)
+                raise
+
+        return len(pending)
+
+    def load(self):
+        """Чтение карты; несохраненные узлы заполняются NaN
+
+        Returns:
+            OptimizeResult с массивами fli, megno, status формы shape и
+            осями x0_values, second_values
+        """
+        fli = np.full(self.size, np.nan)
+        megno = np.full(self.size, np.nan)
+        status = np.full(self.size, -1, dtype=np.int8)
+
+        for index in range(self.n_chunks):
+            path = self._chunk_path(index)
+            if not os.path.exists(path):
+                continue
+            part = slice(index * self.chunk_size, (index + 1) * self.chunk_size)
+            with np.load(path) as data:
+                fli[part] = data['fli']
+                megno[part] = data['megno']
+                status[part] = data['status']
+
+        return OptimizeResult(
+            mu=self.mu, kind=self.kind, t_max=self.t_max,
+            x0_values=self.x0_values, second_values=self.second_values,
+            fli=fli.reshape(self.shape), megno=megno.reshape(self.shape),
+            status=status.reshape(self.shape)
+        )
+
+    def _chunk_path(self, index):
+        return os.path.join(self.output_dir, self.CHUNK_NAME.format(index))
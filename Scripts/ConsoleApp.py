@@ -0,0 +1,406 @@
+"""Консольный запуск решений без графического интерфейса
+
+Примеры:
+    python ConsoleApp.py solve --mu 0.01215 --x0 0.65 --v0 2.07 -o orbit.npz
+    python ConsoleApp.py solve --t-max 1000 --points 1000000 -o long.traj --float32
+    python ConsoleApp.py batch params.csv -d results --plot
+    python ConsoleApp.py solve --mu 0.01215 --x0 0.5 --v0 0.6 --regularize -o close.npz
+    python ConsoleApp.py lyapunov --mu 0.01215 --points 1 2 --orbits 100 -d families
+    python ConsoleApp.py chaos --mu 0.01215 --x0 -1.2 1.2 1000 --C 3.0 3.2 1000 -d map --plot
+    python ConsoleApp.py basins --mu 0.01215 --x0 -1.2 1.2 --v0 -1 1 --levels 6 -d basins --plot
+
+PyQt5 и matplotlib здесь не импортируются; matplotlib (с движком Agg)
+загружается только при запросе сохранения графиков.
+"""
+import time
+
+_START = time.perf_counter()
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+
+# Значения по умолчанию совпадают с полями главного окна
+DEFAULTS = {
+    'x0': 0.65,
+    'y0': 0.0,
+    'u0': 0.0,
+    'v0': 2.07,
+    'mu': 0.5,
+    'method': 'RK45',
+    't_max': 30.0,
+    'points': 20000,
+}
+
+
+def read_parameter_file(path):
+    """Чтение параметров пакетного расчета из файла .json или .csv
+
+    JSON - список объектов, CSV - таблица с заголовком. Имена полей:
+    name, x0, y0, u0, v0, mu, method, t_max, points; отсутствующие поля
+    берутся из DEFAULTS.
+    """
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            rows = json.load(f)
+    else:
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+
+    runs = []
+    for i, row in enumerate(rows):
+        run = dict(DEFAULTS)
+        run.update({key: value for key, value in row.items() if value not in (None, '')})
+        for key in ('x0', 'y0', 'u0', 'v0', 'mu', 't_max'):
+            run[key] = float(run[key])
+        run['points'] = int(float(run['points']))
+        run['name'] = str(run.get('name') or f'run_{i:05d}')
+        runs.append(run)
+    return runs
+
+
+def save_result(path, t, y, run):
+    """Сохранение траектории и параметров запуска в .npz"""
+    import numpy as np
+
+    np.savez(path, t=t, y=y,
+             init_states=np.array([run['x0'], run['y0'], run['u0'], run['v0']]),
+             mu=run['mu'], method=run['method'])
+
+
+def save_plot(path, t, y, run):
+    """Сохранение изображения орбиты (matplotlib загружается только здесь)"""
+    import matplotlib
+    matplotlib.use('Agg')
+    from matplotlib.figure import Figure
+
+    mu = run['mu']
+    figure = Figure(figsize=(8, 6), dpi=100)
+    ax = figure.add_subplot(111)
+    ax.plot(y[0], y[1], 'b-', linewidth=1, label='Траектория')
+    ax.plot(y[0][0], y[1][0], 'go', markersize=8, label='Начало')
+    ax.plot(y[0][-1], y[1][-1], 'ro', markersize=8, label='Конец')
+    ax.plot([-mu, 1 - mu], [0, 0], 'ko', markersize=10)
+    ax.set_xlabel('x')
+    ax.set_ylabel('y')
+    ax.set_title(f"Орбита в ограниченной задаче трех тел\nμ={mu}, метод: {run['method']}")
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+    ax.axis('equal')
+    figure.tight_layout()
+    figure.savefig(path)
+
+
+def solve_runs(runs, output_dir, plot=False, timing=None, regularize=False):
+    """Решение набора запусков с записью результатов в output_dir
+
+    Запуски с одинаковыми методом, интервалом и числом точек решаются
+    вместе через solve_ensemble. При regularize запуски решаются по одному
+    через solve_system(regularize=True), так как solve_ensemble регуляризацию
+    не поддерживает. Для неудавшихся запусков файлы не создаются, причина
+    выводится в stderr.
+
+    Returns:
+        число неудавшихся запусков
+    """
+    import numpy as np
+    from MethodsForSolving import ThreeBodySolver
+
+    os.makedirs(output_dir, exist_ok=True)
+    solver = ThreeBodySolver()
+
+    groups = {}
+    for run in runs:
+        groups.setdefault((run['method'], run['t_max'], run['points']), []).append(run)
+
+    n_failed = 0
+    for (method, t_max, points), group in groups.items():
+        init_states = [[r['x0'], r['y0'], r['u0'], r['v0']] for r in group]
+        mu = [r['mu'] for r in group]
+        t_eval = np.linspace(0, t_max, points)
+        if regularize:
+            outcomes = [solve_regularized_run(solver, state, method, t_max, t_eval, run_mu)
+                        for state, run_mu in zip(init_states, mu)]
+        else:
+            result = solver.solve_ensemble(init_states, method, (0, t_max), t_eval, mu)
+            outcomes = [(result.success[i], result.messages[i], result.t, result.y[i])
+                        for i in range(len(group))]
+        if timing is not None and 'first_solve' not in timing:
+            timing['first_solve'] = time.perf_counter() - _START
+
+        for run, (success, message, t, y) in zip(group, outcomes):
+            if not success:
+                n_failed += 1
+                print(f"{run['name']}: {message}", file=sys.stderr)
+                continue
+            base = os.path.join(output_dir, run['name'])
+            save_result(base + '.npz', t, y, run)
+            if plot:
+                save_plot(base + '.png', t, y, run)
+
+    return n_failed
+
+
+def solve_regularized_run(solver, init_states, method, t_max, t_eval, mu):
+    """Регуляризованное решение одного запуска
+
+    Returns:
+        (success, message, t, y), как для запуска из solve_ensemble
+    """
+    import numpy as np
+
+    try:
+        sol = solver.solve_system(init_states, method, (0, t_max), t_eval, mu, regularize=True)
+    except Exception as e:
+        return False, str(e), None, None
+    if sol.success and not np.isfinite(sol.y).all():
+        return False, "Решение содержит нечисловые значения", None, None
+    if sol.success and sol.t.size != t_eval.size:
+        return False, "Решение получено не во всех точках t_eval", None, None
+    return sol.success, sol.message, sol.t, sol.y
+
+
+def solve_to_storage(args, timing=None):
+    """Одиночное решение с потоковой записью точек в файл траектории"""
+    import numpy as np
+    from MethodsForSolving import ThreeBodySolver
+
+    init_states = [args.x0, args.y0, args.u0, args.v0]
+    t_eval = np.linspace(0, args.t_max, args.points)
+    trajectory = ThreeBodySolver().solve_system(
+        init_states, args.method, (0, args.t_max), t_eval, args.mu,
+        storage_path=args.output, single_precision=args.float32)
+    if timing is not None:
+        print(f"Время решения с записью: {time.perf_counter() - _START:.3f} с",
+              file=sys.stderr)
+
+    if args.plot:
+        run = {'mu': args.mu, 'method': args.method}
+        save_plot(os.path.splitext(args.output)[0] + '.png', trajectory.t, trajectory.y, run)
+    return 0
+
+
+def solve_lyapunov(args):
+    """Построение семейств орбит Ляпунова с записью в output_dir"""
+    from PeriodicOrbits import lyapunov_families, save_family
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    families = lyapunov_families(args.mu, args.points, args.orbits, workers=args.workers,
+                                 step=args.step)
+    for point, family in families.items():
+        path = os.path.join(args.output_dir, f'lyapunov_L{point}.npz')
+        save_family(path, family)
+        print(f"L{point}: {len(family.period)} орбит, T = {family.period[0]:.4f}"
+              f"...{family.period[-1]:.4f} -> {path}", file=sys.stderr)
+    return 0
+
+
+def solve_chaos_map(args):
+    """Расчет (или продолжение расчета) карты индикаторов хаоса"""
+    import numpy as np
+    from ChaosMap import ChaosMap
+
+    if (args.v0 is None) == (args.C is None):
+        print("Нужно задать ровно одну из осей --v0 или --C", file=sys.stderr)
+        return 2
+    kind, (start, stop, count) = ('v0', args.v0) if args.v0 is not None else ('C', args.C)
+    x0_start, x0_stop, x0_count = args.x0
+    chaos_map = ChaosMap(args.output_dir, args.mu,
+                         np.linspace(x0_start, x0_stop, int(x0_count)),
+                         np.linspace(start, stop, int(count)), kind=kind,
+                         t_max=args.t_max, method=args.method)
+
+    def progress(done, total):
+        print(f"\rФрагментов: {done}/{total}", end='', file=sys.stderr, flush=True)
+
+    chaos_map.run(workers=args.workers, progress=progress)
+    print(file=sys.stderr)
+    result = chaos_map.load()
+    np.savez(os.path.join(args.output_dir, 'chaos_map.npz'), **result)
+
+    if args.plot:
+        import matplotlib
+        matplotlib.use('Agg')
+        from matplotlib.figure import Figure
+
+        figure = Figure(figsize=(8, 6), dpi=100)
+        ax = figure.add_subplot(111)
+        image = ax.imshow(result.fli, origin='lower', aspect='auto', cmap='inferno',
+                          extent=(x0_start, x0_stop, start, stop))
+        figure.colorbar(image, ax=ax, label='FLI')
+        ax.set_xlabel('x₀')
+        ax.set_ylabel(kind)
+        ax.set_title(f'FLI, μ={args.mu}, t={args.t_max:g}')
+        figure.tight_layout()
+        figure.savefig(os.path.join(args.output_dir, 'chaos_map.png'))
+    return 0
+
+
+def solve_basin_map(args):
+    """Расчет (или продолжение расчета) адаптивной карты исходов"""
+    import numpy as np
+    from BasinMap import BasinMap
+
+    if (args.v0 is None) == (args.C is None):
+        print("Нужно задать ровно одну из осей --v0 или --C", file=sys.stderr)
+        return 2
+    kind, second_range = ('v0', args.v0) if args.v0 is not None else ('C', args.C)
+    basin_map = BasinMap(args.output_dir, args.mu, args.x0, second_range, kind=kind,
+                         base_size=args.base, max_level=args.levels,
+                         t_max=args.t_max, method=args.method)
+
+    def progress(level, max_level, n_points):
+        print(f"\rУровень {level}/{max_level}, траекторий: {n_points}",
+              end='', file=sys.stderr, flush=True)
+
+    basin_map.run(workers=args.workers, progress=progress)
+    print(file=sys.stderr)
+    result = basin_map.load()
+    image = BasinMap.to_image(result)
+    np.savez(os.path.join(args.output_dir, 'basins.npz'), image=image, **result)
+    print(f"Решено траекторий: {result.n_points} "
+          f"(равномерная сетка: {result.n_uniform})", file=sys.stderr)
+
+    if args.plot:
+        import matplotlib
+        matplotlib.use('Agg')
+        from matplotlib.colors import ListedColormap
+        from matplotlib.figure import Figure
+        from matplotlib.patches import Patch
+
+        codes = sorted(BasinMap.OUTCOME_NAMES)
+        colors = ['black', 'tab:green', 'tab:blue', 'tab:orange', 'tab:red', '0.85']
+        figure = Figure(figsize=(8, 6), dpi=100)
+        ax = figure.add_subplot(111)
+        ax.imshow(image, origin='lower', aspect='auto', interpolation='nearest',
+                  cmap=ListedColormap(colors), vmin=codes[0] - 0.5, vmax=codes[-1] + 0.5,
+                  extent=(*args.x0, *second_range))
+        handles = [Patch(color=color, label=BasinMap.OUTCOME_NAMES[code])
+                   for code, color in zip(codes, colors)]
+        ax.legend(handles=handles, loc='upper right', fontsize='small')
+        ax.set_xlabel('x₀')
+        ax.set_ylabel(kind)
+        ax.set_title(f'Области исходов, μ={args.mu}, t={args.t_max:g}')
+        figure.tight_layout()
+        figure.savefig(os.path.join(args.output_dir, 'basins.png'))
+    return 0
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description="Решение ограниченной задачи трех тел без графического интерфейса")
+    parser.add_argument('--timing', action='store_true',
+                        help="вывести время от запуска до первого решения")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    single = commands.add_parser('solve', help="одиночное решение")
+    for key in ('x0', 'y0', 'u0', 'v0', 'mu'):
+        single.add_argument(f'--{key}', type=float, default=DEFAULTS[key])
+    single.add_argument('--method', default=DEFAULTS['method'])
+    single.add_argument('--t-max', type=float, default=DEFAULTS['t_max'])
+    single.add_argument('--points', type=int, default=DEFAULTS['points'])
+    single.add_argument('-o', '--output', default='orbit.npz',
+                        help="файл результата .npz или .traj (потоковая запись)")
+    single.add_argument('--float32', action='store_true',
+                        help="хранить состояние в файле .traj с одинарной точностью")
+    single.add_argument('--plot', action='store_true',
+                        help="сохранить изображение орбиты рядом с результатом")
+    single.add_argument('--regularize', action='store_true',
+                        help="интегрировать сближения с телами в переменных Леви-Чивиты "
+                             "(не для файлов .traj)")
+
+    batch = commands.add_parser('batch', help="пакетный расчет по файлу параметров")
+    batch.add_argument('parameters', help="файл параметров .json или .csv")
+    batch.add_argument('-d', '--output-dir', default='results')
+    batch.add_argument('--plot', action='store_true',
+                       help="сохранить изображения орбит")
+    batch.add_argument('--regularize', action='store_true',
+                       help="интегрировать сближения с телами в переменных Леви-Чивиты")
+
+    lyapunov = commands.add_parser('lyapunov', help="семейства орбит Ляпунова")
+    lyapunov.add_argument('--mu', type=float, default=DEFAULTS['mu'])
+    lyapunov.add_argument('--points', type=int, nargs='+', default=[1, 2, 3],
+                          choices=[1, 2, 3], help="номера точек Лагранжа")
+    lyapunov.add_argument('--orbits', type=int, default=50,
+                          help="число орбит в каждом семействе")
+    lyapunov.add_argument('--step', type=float, default=1e-2,
+                          help="шаг продолжения по псевдодлине дуги")
+    lyapunov.add_argument('--workers', type=int, default=None)
+    lyapunov.add_argument('-d', '--output-dir', default='families')
+
+    chaos = commands.add_parser('chaos', help="карта индикаторов хаоса FLI и MEGNO")
+    chaos.add_argument('--mu', type=float, default=DEFAULTS['mu'])
+    chaos.add_argument('--x0', type=float, nargs=3, required=True,
+                       metavar=('START', 'STOP', 'COUNT'))
+    chaos.add_argument('--v0', type=float, nargs=3, metavar=('START', 'STOP', 'COUNT'))
+    chaos.add_argument('--C', type=float, nargs=3, metavar=('START', 'STOP', 'COUNT'),
+                       help="ось постоянной Якоби вместо --v0")
+    chaos.add_argument('--t-max', type=float, default=100.0)
+    chaos.add_argument('--method', default='DOP853', choices=['RK45', 'DOP853'])
+    chaos.add_argument('--workers', type=int, default=None)
+    chaos.add_argument('-d', '--output-dir', default='chaos_map')
+    chaos.add_argument('--plot', action='store_true',
+                       help="сохранить изображение карты FLI")
+
+    basins = commands.add_parser('basins', help="адаптивная карта исходов траекторий")
+    basins.add_argument('--mu', type=float, default=DEFAULTS['mu'])
+    basins.add_argument('--x0', type=float, nargs=2, required=True, metavar=('START', 'STOP'))
+    basins.add_argument('--v0', type=float, nargs=2, metavar=('START', 'STOP'))
+    basins.add_argument('--C', type=float, nargs=2, metavar=('START', 'STOP'),
+                        help="ось постоянной Якоби вместо --v0")
+    basins.add_argument('--base', type=int, default=16,
+                        help="число ячеек начальной сетки по оси")
+    basins.add_argument('--levels', type=int, default=6,
+                        help="число уровней измельчения")
+    basins.add_argument('--t-max', type=float, default=50.0)
+    basins.add_argument('--method', default='DOP853', choices=['RK45', 'DOP853'])
+    basins.add_argument('--workers', type=int, default=None)
+    basins.add_argument('-d', '--output-dir', default='basins')
+    basins.add_argument('--plot', action='store_true',
+                        help="сохранить изображение карты")
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    timing = {} if args.timing else None
+
+    if args.command == 'lyapunov':
+        return solve_lyapunov(args)
+    if args.command == 'chaos':
+        return solve_chaos_map(args)
+    if args.command == 'basins':
+        return solve_basin_map(args)
+
+    if args.command == 'solve' and args.output.endswith('.traj'):
+        if args.regularize:
+            print("Регуляризованное решение не записывается в файл .traj", file=sys.stderr)
+            return 2
+        return solve_to_storage(args, timing)
+
+    if args.command == 'solve':
+        output_dir, file_name = os.path.split(os.path.abspath(args.output))
+        run = {key: getattr(args, key) for key in ('x0', 'y0', 'u0', 'v0', 'mu', 'method')}
+        run.update(t_max=args.t_max, points=args.points,
+                   name=os.path.splitext(file_name)[0])
+        runs = [run]
+    else:
+        output_dir = args.output_dir
+        runs = read_parameter_file(args.parameters)
+
+    n_failed = solve_runs(runs, output_dir, plot=args.plot, timing=timing,
+                          regularize=args.regularize)
+
+    if timing is not None:
+        if 'first_solve' in timing:
+            print(f"Время до первого решения: {timing['first_solve']:.3f} с", file=sys.stderr)
+        print(f"Общее время: {time.perf_counter() - _START:.3f} с", file=sys.stderr)
+    return 1 if n_failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+import numpy as np
+
+
+def view_geometry(center_point, bounds, width_px, height_px):
+    """Видимая область и размер пикселя при равном масштабе осей
+
+    Заданные границы расширяются по одной из осей так же, как это делает
+    matplotlib для ax.axis('equal').
+
+    Returns:
+        (x_range, y_range, pixel_size)
+    """
+    x_center, y_center = center_point
+    x_bound, y_bound = bounds
+    width_px = max(float(width_px), 1.0)
+    height_px = max(float(height_px), 1.0)
+
+    pixel_size = max(2 * x_bound / width_px, 2 * y_bound / height_px)
+    half_x = pixel_size * width_px / 2
+    half_y = pixel_size * height_px / 2
+    return ((x_center - half_x, x_center + half_x),
+            (y_center - half_y, y_center + half_y),
+            pixel_size)
+
+
+def decimate_path(x, y, x_range, y_range, pixel_size):
+    """Прореживание траектории для отрисовки в видимой области
+
+    Берутся только концы отрезков, пересекающих область (прямоугольники
+    отрезка и области перекрываются): так сохраняются и точки внутри
+    области с соседями, и отрезки, проходящие через область между
+    соседними отсчетами. Из последовательных точек, попадающих в одну
+    ячейку размером pixel_size, остается первая. Число точек поэтому
+    определяется длиной видимой части траектории в пикселях, а не числом
+    отсчетов решения. Между несмежными видимыми участками вставляется NaN,
+    чтобы matplotlib не соединял их линией.
+
+    Returns:
+        (x, y) - массивы точек для построения линии
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+
+    inside = ((x >= x_range[0]) & (x <= x_range[1]) &
+              (y >= y_range[0]) & (y <= y_range[1]))
+    x0, x1 = x[:-1], x[1:]
+    y0, y1 = y[:-1], y[1:]
+    crossing = ((np.minimum(x0, x1) <= x_range[1]) & (np.maximum(x0, x1) >= x_range[0]) &
+                (np.minimum(y0, y1) <= y_range[1]) & (np.maximum(y0, y1) >= y_range[0]))
+    near = inside.copy()
+    near[:-1] |= crossing
+    near[1:] |= crossing
+
+    idx = np.flatnonzero(near)
+    if idx.size == 0:
+        return np.empty(0), np.empty(0)
+
+    xs = x[idx]
+    ys = y[idx]
+    cell_x = np.floor((xs - x_range[0]) / pixel_size)
+    cell_y = np.floor((ys - y_range[0]) / pixel_size)
+
+    # Разрывы между видимыми участками траектории
+    gap = np.diff(idx) > 1
+    run_id = np.concatenate(([0], np.cumsum(gap)))
+
+    keep = np.ones(idx.size, dtype=bool)
+    keep[1:] = (cell_x[1:] != cell_x[:-1]) | (cell_y[1:] != cell_y[:-1]) | gap
+    keep[:-1] |= gap
+    keep[-1] = True
+
+    xs, ys, run_id = xs[keep], ys[keep], run_id[keep]
+    breaks = np.flatnonzero(np.diff(run_id)) + 1
+    if breaks.size:
+        xs = np.insert(xs.astype(float), breaks, np.nan)
+        ys = np.insert(ys.astype(float), breaks, np.nan)
+    return xs, ys
@@ -0,0 +1,255 @@
+import cProfile
+import itertools
+import json
+import os
+import time
+import weakref
+from contextlib import contextmanager
+
+import numpy as np
+
+
+# Функции hook(event, report, phase), вызываемые при событиях отчетов:
+# 'start' и 'stop' фазы (phase - имя фазы) и 'finish' отчета (phase=None)
+HOOKS = []
+
+
+def add_hook(hook):
+    """Подключение функции наблюдения за отчетами (см. HOOKS)"""
+    HOOKS.append(hook)
+    return hook
+
+
+def remove_hook(hook):
+    """Отключение функции наблюдения"""
+    if hook in HOOKS:
+        HOOKS.remove(hook)
+
+
+def append_log(path, report):
+    """Добавление отчета строкой JSON в журнал запусков"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(report.to_dict(), ensure_ascii=False) + '\n')
+
+
+class RunReport:
+    """Отчет об одном решении: время по фазам, счетчики решателя и шаги
+
+    Время фаз исключительное: вложенная фаза вычитается из объемлющей,
+    поэтому сумма по фазам не превышает общего времени. Фазы одного отчета
+    могут выполняться в разных потоках, но не одновременно (решение в
+    рабочем потоке, отрисовка - в главном).
+    """
+
+    PHASES = ('integration', 'sampling', 'lagrange', 'render')
+
+    PHASE_NAMES = {
+        'integration': 'интегрирование',
+        'sampling': 'вычисление точек',
+        'lagrange': 'точки Лагранжа',
+        'render': 'отрисовка',
+    }
+
+    def __init__(self, **context):
+        """
+        Args:
+            context: параметры запуска (mu, method, init_states, ...),
+                сохраняемые в отчете как есть
+        """
+        self.context = context
+        self.created = time.time()
+        self.timings = dict.fromkeys(self.PHASES, 0.0)
+        self.counters = {'nfev': 0, 'njev': 0, 'nlu': 0, 'accepted': 0, 'rejected': None}
+        self.step_t = []
+        self.step_h = []
+        self._stack = []
+
+    @contextmanager
+    def phase(self, name):
+        """Контекст замера фазы name"""
+        for hook in HOOKS:
+            hook('start', self, name)
+        frame = [time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield self
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            self.timings[name] = self.timings.get(name, 0.0) + elapsed - frame[1]
+            if self._stack:
+                self._stack[-1][1] += elapsed
+            for hook in HOOKS:
+                hook('stop', self, name)
+
+    def add_time(self, name, seconds):
+        """Время фазы, замеренное вызывающим кодом
+
+        Для частых коротких фаз (например, по шагам решения), где контекст
+        phase обходится слишком дорого; время считается вложенным в текущую
+        фазу. Функции наблюдения не вызываются.
+        """
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+        if self._stack:
+            self._stack[-1][1] += seconds
+
+    def record_stepper(self, stepper):
+        """Счетчики вычислений пошагового решателя scipy"""
+        self.counters['nfev'] = int(stepper.nfev)
+        self.counters['njev'] = int(stepper.njev)
+        self.counters['nlu'] = int(stepper.nlu)
+
+    def record_step(self, t, h, rejected=None):
+        """Принятый шаг h, закончившийся в момент t
+
+        rejected - число отвергнутых попыток перед ним, если известно
+        """
+        self.step_t.append(t)
+        self.step_h.append(h)
+        self.counters['accepted'] += 1
+        if rejected is not None:
+            self.counters['rejected'] = (self.counters['rejected'] or 0) + rejected
+
+    def finish(self):
+        """Завершение отчета (вызывает функции наблюдения)"""
+        for hook in HOOKS:
+            hook('finish', self, None)
+        return self
+
+    @property
+    def total_time(self):
+        return sum(self.timings.values())
+
+    def slowest_phase(self):
+        """Фаза с наибольшим временем"""
+        return max(self.timings, key=self.timings.get)
+
+    def step_histogram(self, bins=12):
+        """Распределение принятых шагов по log10(h)
+
+        Returns:
+            (counts, edges) - число шагов в интервалах между edges
+        """
+        h = np.asarray(self.step_h)
+        h = h[h > 0]
+        if not h.size:
+            return np.zeros(0, dtype=int), np.zeros(0)
+        log_h = np.log10(h)
+        low, high = log_h.min(), log_h.max()
+        counts, edges = np.histogram(log_h, bins=bins,
+                                     range=(low, high) if high > low else (low - 0.5, low + 0.5))
+        return counts, 10.0 ** edges
+
+    def step_profile(self, bins=10):
+        """Шаги по ходу решения: наименьший и средний шаг на интервалах t
+
+        Returns:
+            список (t_start, t_end, число шагов, наименьший шаг, средний шаг)
+        """
+        t = np.asarray(self.step_t)
+        h = np.asarray(self.step_h)
+        if not t.size:
+            return []
+        edges = np.linspace(t[0] - h[0], t[-1], bins + 1)
+        index = np.clip(np.searchsorted(edges, t, side='left') - 1, 0, bins - 1)
+        profile = []
+        for k in range(bins):
+            steps = h[index == k]
+            if steps.size:
+                profile.append((float(edges[k]), float(edges[k + 1]), int(steps.size),
+                                float(steps.min()), float(steps.mean())))
+        return profile
+
+    def to_dict(self):
+        """Отчет в виде, пригодном для записи в JSON"""
+        counts, edges = self.step_histogram()
+        return {
+            'created': self.created,
+            'context': {key: np.asarray(value).tolist() if isinstance(value, (np.ndarray, list, tuple))
+                        else value for key, value in self.context.items()},
+            'timings': self.timings,
+            'total_time': self.total_time,
+            'counters': self.counters,
+            'step_histogram': {'counts': counts.tolist(), 'edges': edges.tolist()},
+            'step_profile': self.step_profile(),
+        }
+
+    def summary_html(self):
+        """Отчет для информационной панели главного окна"""
+        rows = ''.join(
+            f"<tr><td>{self.PHASE_NAMES.get(name, name)}</td>"
+            f"<td align='right'>{seconds * 1000:.1f} мс</td></tr>"
+            for name, seconds in self.timings.items())
+        counters = self.counters
+        rejected = counters['rejected'] if counters['rejected'] is not None else 'нет данных'
+        html = (f"<p><b>Время по фазам</b> (всего {self.total_time:.3f} с, больше всего - "
+                f"{self.PHASE_NAMES.get(self.slowest_phase())}):</p>"
+                f"<table>{rows}</table>"
+                f"<p>Вычислений правой части: {counters['nfev']}, якобиана: "
+                f"{counters['njev']}, LU-разложений: {counters['nlu']}<br>"
+                f"Шагов принято: {counters['accepted']}, отвергнуто: {rejected}</p>")
+
+        counts, edges = self.step_histogram()
+        if counts.size:
+            peak = counts.max()
+            bars = ''.join(
+                f"<tr><td>{low:.1e} - {high:.1e}</td><td>{count}</td>"
+                f"<td>{'█' * int(round(20 * count / peak))}</td></tr>"
+                for low, high, count in zip(edges[:-1], edges[1:], counts))
+            html += f"<p><b>Распределение шагов:</b></p><table>{bars}</table>"
+
+            profile = self.step_profile()
+            rows = ''.join(
+                f"<tr><td>{start:.3g} - {end:.3g}</td><td>{n}</td><td>{smallest:.1e}</td></tr>"
+                for start, end, n, smallest, _ in profile)
+            html += (f"<p><b>Шаги по времени</b> (интервал t, число шагов, наименьший шаг):</p>"
+                     f"<table>{rows}</table>")
+        return html
+
+
+class ProfileHook:
+    """Профилирование фаз отчетов с помощью cProfile
+
+    Профилируется только внешняя из выполняющихся фаз: вложенные фазы
+    (например, 'lagrange' внутри 'render') входят в ее профиль, а второй
+    профилировщик не запускается - cProfile не допускает одновременной
+    работы нескольких профилировщиков. Статистика сохраняется в output_dir
+    в файлы <номер отчета>_<фаза>.prof (см. модуль pstats).
+
+        hook = add_hook(ProfileHook('profiles', phases=('integration',)))
+    """
+
+    def __init__(self, output_dir, phases=None):
+        self.output_dir = output_dir
+        self.phases = phases
+        self._profiles = weakref.WeakKeyDictionary()
+        self._numbers = weakref.WeakKeyDictionary()
+        self._counter = itertools.count(1)
+        self._active = None
+        os.makedirs(output_dir, exist_ok=True)
+
+    def __call__(self, event, report, phase):
+        if event == 'finish':
+            self._profiles.pop(report, None)
+            return
+        if self.phases is not None and phase not in self.phases:
+            return
+
+        # Глубина вложенности отличает внешнюю фазу от вложенной фазы с тем же именем
+        key = (report, phase, len(report._stack))
+        if event == 'start':
+            if self._active is not None:
+                return
+            self._active = key
+            # Повторные замеры фазы одного отчета накапливаются в одном профиле
+            profile = self._profiles.setdefault(report, {}).setdefault(phase, cProfile.Profile())
+            profile.enable()
+        elif self._active == key:
+            self._active = None
+            profile = self._profiles[report][phase]
+            profile.disable()
+            if report not in self._numbers:
+                self._numbers[report] = next(self._counter)
+            number = self._numbers[report]
+            profile.dump_stats(os.path.join(self.output_dir, f'{number:04d}_{phase}.prof'))
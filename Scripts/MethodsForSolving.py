@@ -1,75 +1,593 @@
-from scipy.integrate import solve_ivp
+import math
+import time
+from contextlib import nullcontext
+from functools import lru_cache
+
+from scipy.integrate import BDF, DOP853, LSODA, RK45, Radau, solve_ivp
 import numpy as np
+from scipy.optimize import OptimizeResult
+from TrajectoryStorage import StoredTrajectory, TrajectoryWriter
+
+class EnsembleResult:
+    """Результат совместного интегрирования набора траекторий"""
+
+    # Коды исхода траектории
+    FAILED = -1
+    COMPLETED = 0
+    COLLISION_M1 = 1
+    COLLISION_M2 = 2
+    ESCAPE = 3
+
+    def __init__(self, t, y, mu, success, messages, outcome=None):
+        self.t = t  # моменты времени, (T,)
+        self.y = y  # траектории, (N, 4, T)
+        self.mu = mu  # массовые параметры, (N,)
+        self.success = success  # признак успешного решения, (N,)
+        self.messages = messages  # пояснения для каждой траектории
+        # исход каждой траектории (коды выше), (N,)
+        self.outcome = np.where(success, self.COMPLETED, self.FAILED) \
+            if outcome is None else outcome
+
+    @property
+    def failed(self):
+        """Индексы траекторий, решение для которых не получено"""
+        return np.flatnonzero(~self.success)
+
+    def __len__(self):
+        return len(self.success)
+
+
+@lru_cache(maxsize=256)
+def _lagrange_points_cached(mu):
+    """Точки Лагранжа для одного μ в виде кортежа ((x, y), ...)"""
+    return tuple((float(x), float(y)) for x, y in ThreeBodySolver.lagrange_points(mu)[0])
+
+
+@lru_cache(maxsize=8)
+def _potential_grid_cached(mu, extent, resolution):
+    """Сетка значений 2Ω для одного μ: (x, y, 2Ω)"""
+    axis = np.linspace(-extent, extent, resolution)
+    x, y = np.meshgrid(axis, axis)
+    with np.errstate(divide='ignore'):
+        values = 2 * ThreeBodySolver.effective_potential(x, y, mu)
+    # Значения у тел бесконечны; для построения изолиний достаточно
+    # ограничить их сверху
+    np.minimum(values, 1e3, out=values)
+    for array in (axis, values):
+        array.setflags(write=False)
+    return axis, axis, values
+
+
+def integrate_lanes(fun, y0, t_span, tableau, rtol, atol, on_step, args=()):
+    """Векторизованная схема Рунге-Кутты с собственным шагом для каждой траектории
+
+    Повторяет управление шагом solve_ivp (те же коэффициенты, начальный шаг
+    и оценка ошибки) сразу для всех столбцов y0 формы (d, m); завершенные
+    траектории исключаются из рабочих массивов.
+
+    Args:
+        fun: правая часть fun(t, y, *args) для t формы (m,) и y формы (d, m)
+        tableau: класс метода solve_ivp с таблицей Бутчера (RK45 или DOP853)
+        on_step: функция on_step(step), вызываемая после каждой попытки
+            шага. Она может менять step.y_new и step.f_new на месте и
+            возвращает маску траекторий, которые нужно исключить, или None
+        args: дополнительные аргументы fun - массивы длины m
+
+    Поля step относятся к активным траекториям: idx - их номера в y0;
+    t, y, f - состояние до шага; h, t_new, y_new, f_new и стадии K - сам
+    шаг; args; accepted - шаг принят; finished - достигнут конец интервала;
+    broken - решение расходится; too_small - шаг стал слишком малым.
+    Траектории с finished, broken или too_small исключаются всегда.
+    """
+    n_stages = tableau.n_stages
+    error_exponent = -1 / (tableau.error_estimator_order + 1)
+    t0, t_end = float(t_span[0]), float(t_span[1])
+
+    idx = np.arange(y0.shape[1])
+    y = np.array(y0, dtype=float)
+    args = tuple(args)
+    t = np.full(idx.size, t0)
+    f = fun(t, y, *args)
+
+    # Начальный шаг (Hairer, Norsett, Wanner, разд. II.4)
+    scale = atol + np.abs(y) * rtol
+    d0 = np.sqrt(np.mean((y / scale) ** 2, axis=0))
+    d1 = np.sqrt(np.mean((f / scale) ** 2, axis=0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h0 = np.where((d0 < 1e-5) | (d1 < 1e-5), 1e-6, 0.01 * d0 / d1)
+    h0 = np.minimum(h0, t_end - t0)
+    f1 = fun(t + h0, y + h0 * f, *args)
+    d2 = np.sqrt(np.mean(((f1 - f) / scale) ** 2, axis=0)) / h0
+    d12 = np.maximum(d1, d2)
+    with np.errstate(divide='ignore'):
+        h1 = np.where(d12 <= 1e-15, np.maximum(1e-6, h0 * 1e-3),
+                      (0.01 / d12) ** (1 / (tableau.order + 1)))
+    h_abs = np.minimum(100 * h0, h1)
+    rejected = np.zeros(idx.size, dtype=bool)
+
+    K = np.empty((n_stages + 1,) + y.shape)
+    while idx.size:
+        min_step = 10 * np.abs(np.nextafter(t, np.inf) - t)
+        h = np.minimum(np.maximum(h_abs, min_step), t_end - t)
+        t_new = np.where(t + h >= t_end, t_end, t + h)
+        h = t_new - t
+
+        # Стадии явной схемы
+        K[0] = f
+        for s_i in range(1, n_stages):
+            dy = np.einsum('skm,s->km', K[:s_i], tableau.A[s_i, :s_i]) * h
+            K[s_i] = fun(t + tableau.C[s_i] * h, y + dy, *args)
+        y_new = y + np.einsum('skm,s->km', K[:n_stages], tableau.B) * h
+        f_new = fun(t_new, y_new, *args)
+        K[n_stages] = f_new
+
+        scale = atol + np.maximum(np.abs(y), np.abs(y_new)) * rtol
+        norm = _lane_error_norm(tableau, K, h, scale)
+        accepted = norm < 1
+        with np.errstate(divide='ignore'):
+            factor = np.where(
+                accepted,
+                np.where(norm == 0, 10.0, np.minimum(10.0, 0.9 * norm ** error_exponent)),
+                np.maximum(0.2, 0.9 * norm ** error_exponent)
+            )
+        factor = np.where(accepted & rejected, np.minimum(1.0, factor), factor)
+        h_abs = h * factor
+
+        step = OptimizeResult(
+            idx=idx, t=t, y=y, f=f, h=h, t_new=t_new, y_new=y_new, f_new=f_new,
+            K=K, args=args, accepted=accepted,
+            finished=accepted & (t_new >= t_end),
+            broken=~np.isfinite(norm) | ~np.isfinite(y_new).all(axis=0),
+            too_small=~accepted & (h_abs < min_step)
+        )
+        stop = step.finished | step.broken | step.too_small
+        extra = on_step(step)
+        if extra is not None:
+            stop |= extra
+
+        t = np.where(accepted, t_new, t)
+        y = np.where(accepted, y_new, y)
+        f = np.where(accepted, f_new, f)
+        rejected = ~accepted
+
+        if stop.any():
+            keep = ~stop
+            idx, y, f, t = idx[keep], y[:, keep], f[:, keep], t[keep]
+            args = tuple(arg[keep] for arg in args)
+            h_abs, rejected = h_abs[keep], rejected[keep]
+            K = K[:, :, keep]
+
+
+def _lane_error_norm(tableau, K, h, scale):
+    """Оценка ошибки шага в норме solve_ivp для каждой траектории"""
+    if tableau is DOP853:
+        err5_sq = np.sum((np.einsum('skm,s->km', K, tableau.E5) / scale) ** 2, axis=0)
+        err3_sq = np.sum((np.einsum('skm,s->km', K, tableau.E3) / scale) ** 2, axis=0)
+        denom = err5_sq + 0.01 * err3_sq
+        with np.errstate(invalid='ignore', divide='ignore'):
+            norm = h * err5_sq / np.sqrt(denom * K.shape[1])
+        return np.where(denom > 0, norm, 0.0)
+    err = np.einsum('skm,s->km', K, tableau.E) * h / scale
+    return np.sqrt(np.mean(err ** 2, axis=0))
+
+
+class LazyTrajectory:
+    """Решение в виде интерполянта, вычисляющего точки по запросу
+
+    Хранит только шаги интегратора и коэффициенты интерполяции на них,
+    поэтому объем памяти зависит от числа шагов, а не от числа точек.
+    Срез traj[t_start:t_stop:dt] возвращает (t, y) с шагом dt, индекс
+    traj[t] - состояние в момент t.
+    """
+
+    def __init__(self, sol):
+        self.interpolant = sol.sol
+        self.t_steps = sol.t  # моменты шагов интегратора
+        self.success = sol.success
+        self.message = sol.message
+        self.nfev = sol.nfev
+        self.njev = sol.njev
+        self.nlu = sol.nlu
+
+    @property
+    def t_min(self):
+        return self.interpolant.t_min
+
+    @property
+    def t_max(self):
+        return self.interpolant.t_max
+
+    @property
+    def n_steps(self):
+        """Число шагов интегратора"""
+        return len(self.t_steps) - 1
+
+    def __call__(self, t):
+        """Состояние (4,) или состояния (4, n) в моменты t"""
+        return self.interpolant(t)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self.interpolant(key)
+        t_start = self.t_min if key.start is None else key.start
+        t_stop = self.t_max if key.stop is None else key.stop
+        if key.step is None:
+            return self.sample(t_start, t_stop)
+        t = np.arange(t_start, t_stop, key.step)
+        return t, self.interpolant(t)
+
+    def sample(self, t_start=None, t_stop=None, n_points=1000):
+        """Равномерная выборка n_points точек на отрезке [t_start, t_stop]"""
+        t_start = self.t_min if t_start is None else t_start
+        t_stop = self.t_max if t_stop is None else t_stop
+        t = np.linspace(t_start, t_stop, n_points)
+        return t, self.interpolant(t)
+
+    def iter_chunks(self, t_start=None, t_stop=None, n_points=1000, chunk_size=10000):
+        """Выборка как в sample(), выдаваемая фрагментами по chunk_size точек"""
+        t_start = self.t_min if t_start is None else t_start
+        t_stop = self.t_max if t_stop is None else t_stop
+        dt = (t_stop - t_start) / max(n_points - 1, 1)
+        for first in range(0, n_points, chunk_size):
+            index = np.arange(first, min(first + chunk_size, n_points))
+            t = t_start + index * dt
+            if index[-1] == n_points - 1:
+                t[-1] = t_stop
+            yield t, self.interpolant(t)
+
+    def to_result(self, n_points):
+        """Выборка в виде результата solve_ivp для построения графиков"""
+        t, y = self.sample(n_points=n_points)
+        return OptimizeResult(t=t, y=y, success=self.success, status=0,
+                              message=self.message, nfev=self.nfev,
+                              njev=self.njev, nlu=self.nlu)
+
 
 class ThreeBodySolver:
     """Решатель ограниченной задачи трех тел"""
 
+    # Допуски интегрирования по умолчанию
+    RTOL = 1e-8
+    ATOL = 1e-11
+
+    # Доступные методы интегрирования; неявным передается матрица Якоби
+    METHODS = ('RK45', 'DOP853', 'LSODA', 'Radau', 'BDF')
+    IMPLICIT_METHODS = ('LSODA', 'Radau', 'BDF')
+
+    # Классы пошаговых решателей для iter_solution
+    STEPPERS = {'RK45': RK45, 'DOP853': DOP853, 'LSODA': LSODA,
+                'Radau': Radau, 'BDF': BDF}
+
+    # Методы, для которых solve_ensemble использует векторизованную схему
+    ENSEMBLE_METHODS = {'RK45': RK45, 'DOP853': DOP853}
+
     @staticmethod
     def equations(t, state, mu):
         """Уравнения движения ограниченной задачи трех тел"""
-        x, y, u, v = state
+        # solve_ivp может хранить ссылку на возвращенный массив между
+        # стадиями шага, поэтому общий буфер здесь использовать нельзя
+        return ThreeBodySolver.equations_into(t, state, mu, np.empty(4))
+
+    @staticmethod
+    def equations_into(t, state, mu, out):
+        """Уравнения движения с записью производных в готовый буфер out"""
+        x, y, u, v = state.tolist() if isinstance(state, np.ndarray) else state
 
-        # Расстояния до двух массивных тел
-        r1 = np.sqrt((x + mu) ** 2 + y ** 2)
-        r2 = np.sqrt((x - 1 + mu) ** 2 + y ** 2)
+        # Расстояния до двух массивных тел (в виде множителей r^-3)
+        dx1 = x + mu
+        dx2 = dx1 - 1.0
+        y2 = y * y
+        r1_sq = dx1 * dx1 + y2
+        r2_sq = dx2 * dx2 + y2
+        k1 = (1.0 - mu) / (r1_sq * math.sqrt(r1_sq))
+        k2 = mu / (r2_sq * math.sqrt(r2_sq))
 
         # Уравнения движения
-        dxdt = u
-        dydt = v
-        dudt = (2 * v + x -
-                (1 - mu) * (x + mu) / r1 ** 3 - mu * (x + mu - 1) / r2 ** 3)
-        dvdt = (-2 * u + y -
-                (1 - mu) * y / r1 ** 3 - mu * y / r2 ** 3)
+        out[0] = u
+        out[1] = v
+        out[2] = 2.0 * v + x - k1 * dx1 - k2 * dx2
+        out[3] = -2.0 * u + y - (k1 + k2) * y
+        return out
+
+    @staticmethod
+    def jacobian(t, state, mu):
+        """Аналитическая матрица Якоби правой части"""
+        x, y = float(state[0]), float(state[1])
+
+        dx1 = x + mu
+        dx2 = dx1 - 1.0
+        y2 = y * y
+        r1_sq = dx1 * dx1 + y2
+        r2_sq = dx2 * dx2 + y2
+        k1 = (1.0 - mu) / (r1_sq * math.sqrt(r1_sq))
+        k2 = mu / (r2_sq * math.sqrt(r2_sq))
+        q1 = 3.0 * k1 / r1_sq
+        q2 = 3.0 * k2 / r2_sq
 
-        return [dxdt, dydt, dudt, dvdt]
+        # Вторые производные эффективного потенциала
+        omega_xx = 1.0 - k1 - k2 + q1 * dx1 * dx1 + q2 * dx2 * dx2
+        omega_yy = 1.0 - k1 - k2 + (q1 + q2) * y2
+        omega_xy = (q1 * dx1 + q2 * dx2) * y
+
+        return np.array([
+            [0.0, 0.0, 1.0, 0.0],
+            [0.0, 0.0, 0.0, 1.0],
+            [omega_xx, omega_xy, 0.0, 2.0],
+            [omega_xy, omega_yy, -2.0, 0.0]
+        ])
+
+    @staticmethod
+    def variational_equations(t, z, mu):
+        """Уравнения движения вместе с уравнениями в вариациях
+
+        z = [x, y, u, v, Φ], где Φ - матрица перехода состояния 4x4,
+        записанная по строкам; dΦ/dt = A(t)Φ, A - матрица Якоби.
+        """
+        out = np.empty(20)
+        ThreeBodySolver.equations_into(t, z[:4], mu, out[:4])
+        out[4:] = (ThreeBodySolver.jacobian(t, z, mu) @ z[4:].reshape(4, 4)).ravel()
+        return out
+
+    @staticmethod
+    def variational_ensemble(t, z, mu):
+        """Векторизованные уравнения движения и уравнения в вариациях
+
+        Args:
+            z: массив формы (8, N): x, y, u, v и вектор вариаций δ
+            mu: массовый параметр, скаляр или массив длины N
+
+        Returns:
+            производные формы (8, N)
+        """
+        x, y, u, v, dx, dy, du, dv = z
+        out = np.empty_like(z)
+
+        dx1 = x + mu
+        dx2 = dx1 - 1.0
+        y2 = y * y
+        r1_sq = dx1 * dx1 + y2
+        r2_sq = dx2 * dx2 + y2
+        k1 = (1.0 - mu) / (r1_sq * np.sqrt(r1_sq))
+        k2 = mu / (r2_sq * np.sqrt(r2_sq))
+        out[0] = u
+        out[1] = v
+        out[2] = 2.0 * v + x - k1 * dx1 - k2 * dx2
+        out[3] = -2.0 * u + y - (k1 + k2) * y
+
+        # Вторые производные эффективного потенциала (см. jacobian)
+        q1 = 3.0 * k1 / r1_sq
+        q2 = 3.0 * k2 / r2_sq
+        base = 1.0 - k1 - k2
+        omega_xy = (q1 * dx1 + q2 * dx2) * y
+        out[4] = du
+        out[5] = dv
+        out[6] = (base + q1 * dx1 * dx1 + q2 * dx2 * dx2) * dx + omega_xy * dy + 2.0 * dv
+        out[7] = omega_xy * dx + (base + (q1 + q2) * y2) * dy - 2.0 * du
+        return out
+
+    @staticmethod
+    def equations_ensemble(t, states, mu):
+        """Векторизованные уравнения движения для набора траекторий
+
+        Args:
+            states: массив формы (4, N) или плоский вектор длины 4N
+                (сначала все x, затем y, u, v)
+            mu: массовый параметр, скаляр или массив длины N
+        """
+        x, y, u, v = states.reshape(4, -1)
+
+        dx1 = x + mu
+        dx2 = x - 1 + mu
+        y2 = y * y
+        r1_sq = dx1 * dx1 + y2
+        r2_sq = dx2 * dx2 + y2
+        k1 = (1 - mu) / (r1_sq * np.sqrt(r1_sq))
+        k2 = mu / (r2_sq * np.sqrt(r2_sq))
+
+        derivs = np.empty((4, x.size))
+        derivs[0] = u
+        derivs[1] = v
+        derivs[2] = 2 * v + x - k1 * dx1 - k2 * dx2
+        derivs[3] = -2 * u + y - (k1 + k2) * y
+
+        # Траектории, попавшие точно в тело, "замораживаются"
+        frozen = ~np.isfinite(derivs).all(axis=0)
+        if frozen.any():
+            derivs[:, frozen] = 0.0
+
+        return derivs.reshape(states.shape)
+
+    @staticmethod
+    def effective_potential(x, y, mu):
+        """Эффективный потенциал Ω = (x² + y²)/2 + (1-μ)/r₁ + μ/r₂"""
+        r1 = np.hypot(x + mu, y)
+        r2 = np.hypot(x - 1 + mu, y)
+        return (x * x + y * y) / 2 + (1 - mu) / r1 + mu / r2
+
+    @staticmethod
+    def jacobi_constant(states, mu):
+        """Постоянная Якоби C = 2Ω - u² - v² для состояний формы (4, ...)"""
+        x, y, u, v = states
+        return 2 * ThreeBodySolver.effective_potential(x, y, mu) - (u * u + v * v)
+
+    @staticmethod
+    def jacobi_drift(states, mu, C0=None):
+        """Статистика отклонения постоянной Якоби вдоль траектории
+
+        Args:
+            states: состояния формы (4, n)
+            C0: опорное значение; по умолчанию - C в первой точке
+
+        Returns:
+            OptimizeResult с полями C0, max_drift, mean_drift, final_drift
+            (абсолютные отклонения), relative_drift (max_drift / |C0|)
+            и t_index - номер точки с наибольшим отклонением
+        """
+        C = ThreeBodySolver.jacobi_constant(np.asarray(states, dtype=float), mu)
+        if C0 is None:
+            C0 = float(C[0]) if C.size else np.nan
+        drift = np.abs(C - C0)
+        if not drift.size:
+            drift = np.zeros(1)
+        max_drift = float(drift.max())
+        return OptimizeResult(
+            C0=C0,
+            max_drift=max_drift,
+            mean_drift=float(drift.mean()),
+            final_drift=float(drift[-1]),
+            relative_drift=max_drift / abs(C0) if C0 else np.inf,
+            t_index=int(drift.argmax())
+        )
+
+    @staticmethod
+    def potential_grid(mu, extent=2.5, resolution=801):
+        """Сетка значений 2Ω в квадрате [-extent, extent]²
+
+        Сетка вычисляется один раз для каждой пары (μ, extent) и используется
+        при всех перерисовках кривых нулевой скорости 2Ω(x, y) = C.
+
+        Returns:
+            (x, y, values): оси сетки и массив values формы (resolution, resolution)
+        """
+        return _potential_grid_cached(float(mu), float(extent), int(resolution))
 
     @staticmethod
     def get_lagrange_points_simple(mu):
-        """Упрощенное получение точек лагранжа с поиском в известных интервалах"""
-        tol = 1e-6
-        l1, l2, l3 = 0, 0, 0
-
-        # Известные приближенные положения точек Лагранжа
-        # L3 слева от m1, L1 между m1 и m2, L2 справа от m2
-        search_intervals = [
-            (-1.5, -0.5),  # Для L3 (слева от центра масс)
-            (0.5, 0.9),  # Для L1 (между телами)
-            (1.1, 1.5)  # Для L2 (справа от m2)
-        ]
+        """Абсциссы коллинеарных точек Лагранжа (L1, L2, L3)"""
+        points = ThreeBodySolver.get_lagrange_points(mu)
+        return points[0][0], points[1][0], points[2][0]
+
+    @staticmethod
+    def get_lagrange_points(mu):
+        """Координаты точек L1-L5 для одного μ (результат кэшируется)"""
+        return _lagrange_points_cached(float(mu))
+
+    @staticmethod
+    def lagrange_points(mu_values):
+        """Точки Лагранжа для массива значений μ
+
+        Коллинеарные точки находятся одновременно для всех μ методом Ньютона
+        с защитой делением пополам: на каждом из интервалов (-2, -μ),
+        (-μ, 1-μ), (1-μ, 2) функция возрастает и имеет единственный корень,
+        поэтому итерации сходятся квадратично до машинной точности.
+
+        Returns:
+            массив формы (N, 5, 2) с координатами (x, y) точек L1-L5
+        """
+        mu = np.atleast_1d(np.asarray(mu_values, dtype=float))
+        if np.any((mu <= 0) | (mu > 0.5)):
+            raise ValueError("Массовый параметр должен лежать в интервале (0, 0.5]")
 
         def equation(x):
-            r1 = np.sqrt((x + mu) ** 2)
-            r2 = np.sqrt((x - 1 + mu) ** 2)
-            return x - (1 - mu) * (x + mu) / r1 ** 3 - mu * (x + mu - 1) / r2 ** 3
-
-        for i, (a, b) in enumerate(search_intervals):
-            # Поиск корня методом деления пополам
-            left, right = a, b
-            f_left = equation(left)
-
-            for _ in range(100):  # Максимум 100 итераций
-                mid = (left + right) / 2
-                f_mid = equation(mid)
-
-                if abs(f_mid) < tol:
-                    if i == 0:
-                        l3 = mid
-                    elif i == 1:
-                        l1 = mid
-                    elif i == 2:
-                        l2 = mid
+            s1 = x + mu
+            s2 = x - 1 + mu
+            a1 = np.abs(s1) ** 3
+            a2 = np.abs(s2) ** 3
+            f = x - (1 - mu) * s1 / a1 - mu * s2 / a2
+            df = 1 + 2 * (1 - mu) / a1 + 2 * mu / a2
+            return f, df
+
+        # Начальные приближения по радиусу сферы Хилла
+        hill = np.cbrt(mu / 3)
+        brackets = [
+            (-mu, 1 - mu, 1 - mu - hill),  # L1
+            (1 - mu, np.full_like(mu, 2.0), 1 - mu + hill),  # L2
+            (np.full_like(mu, -2.0), -mu, -1 - 5 * mu / 12)  # L3
+        ]
+
+        points = np.zeros((mu.size, 5, 2))
+        for k, (lo, hi, guess) in enumerate(brackets):
+            lo, hi = lo.copy(), hi.copy()
+            x = np.where((guess > lo) & (guess < hi), guess, (lo + hi) / 2)
+            for _ in range(100):
+                f, df = equation(x)
+                lo = np.where(f < 0, x, lo)
+                hi = np.where(f > 0, x, hi)
+                x_new = x - f / df
+                outside = ~((x_new > lo) & (x_new < hi))
+                x_new = np.where(outside, (lo + hi) / 2, x_new)
+                converged = np.abs(x_new - x) <= 4 * np.finfo(float).eps * np.abs(x_new)
+                x = x_new
+                if np.all(converged | (f == 0)):
                     break
+            else:
+                raise RuntimeError("Точки Лагранжа не найдены: итерации не сошлись")
+            points[:, k, 0] = x
 
-                if f_left * f_mid < 0:
-                    right = mid
-                else:
-                    left = mid
-                    f_left = f_mid
+        # Треугольные точки L4 и L5
+        points[:, 3] = np.column_stack([0.5 - mu, np.full_like(mu, np.sqrt(3) / 2)])
+        points[:, 4] = np.column_stack([0.5 - mu, np.full_like(mu, -np.sqrt(3) / 2)])
+        return points
+
+    def solve_system(self, init_states, method, t_span, t_eval, mu,
+                     rtol=RTOL, atol=ATOL, dense=False, storage_path=None,
+                     single_precision=False, regularize=False, max_jacobi_drift=None,
+                     report=None):
+        """Решение системы уравнений
+
+        При dense=True сетка t_eval не используется, а возвращается
+        LazyTrajectory, вычисляющая точки решения по запросу.
+        При заданном storage_path точки t_eval по мере интегрирования
+        записываются в файл траектории (в float32 при single_precision),
+        и возвращается StoredTrajectory, открытая из этого файла.
+        При regularize=True сближения с телами интегрируются в переменных
+        Леви-Чивиты (см. Regularization.solve_regularized).
 
-        return l1, l2, l3
+        К результату с точками t_eval добавляется статистика дрейфа
+        постоянной Якоби sol.jacobi (см. jacobi_drift). При заданном
+        max_jacobi_drift решение останавливается, как только отклонение C
+        от начального значения превысит этот порог; вместе с regularize и
+        storage_path этот порог, как и dense, не поддерживается.
 
-    def solve_system(self, init_states, method, t_span, t_eval, mu):
-        """Решение системы уравнений"""
+        В отчет report (Instrumentation.RunReport) записываются время
+        интегрирования и счетчики вычислений решателя.
+        """
+        if regularize and storage_path is not None:
+            raise ValueError("Регуляризованное решение не записывается в файл траектории")
+        if (regularize or storage_path is not None) and (dense or max_jacobi_drift is not None):
+            raise ValueError("Параметры dense и max_jacobi_drift не поддерживаются "
+                             "при regularize=True и записи в файл траектории")
+
+        C0 = float(self.jacobi_constant(np.asarray(init_states, dtype=float), mu))
+
+        if regularize:
+            from Regularization import solve_regularized
+            start = time.perf_counter()
+            sol = solve_regularized(self, init_states, method, t_span, t_eval,
+                                    mu, rtol, atol)
+            if report is not None:
+                report.add_time('integration', time.perf_counter() - start)
+                report.counters['nfev'] = int(sol.nfev)
+            sol.jacobi = self.jacobi_drift(sol.y, mu, C0)
+            return sol
+
+        if storage_path is not None:
+            metadata = {
+                'mu': mu, 'method': method, 'rtol': rtol, 'atol': atol,
+                'init_states': [float(value) for value in init_states],
+                't_span': [float(value) for value in t_span]
+            }
+            # Время выборки точек iter_solution вычитается из времени интегрирования
+            phase = report.phase('integration') if report is not None else nullcontext()
+            with phase, TrajectoryWriter(storage_path, metadata, single_precision) as writer:
+                for _, t_chunk, y_chunk in self.iter_solution(
+                        init_states, method, t_span, t_eval, mu,
+                        rtol=rtol, atol=atol, report=report):
+                    writer.append(t_chunk, y_chunk)
+            trajectory = StoredTrajectory(storage_path)
+            trajectory.jacobi = self.jacobi_drift(trajectory.y, mu, C0)
+            return trajectory
+
+        options = {}
+        if method in self.IMPLICIT_METHODS:
+            options['jac'] = self.jacobian
+        if dense:
+            options['dense_output'] = True
+            t_eval = None
+        if max_jacobi_drift is not None:
+            options['events'] = self._jacobi_event(C0, max_jacobi_drift)
+
+        start = time.perf_counter()
         sol = solve_ivp(
             fun=self.equations,
             t_span=t_span,
@@ -77,7 +595,297 @@ class ThreeBodySolver:
             method=method,
             t_eval=t_eval,
             args=(mu,),
-            rtol=1e-8,
-            atol=1e-11
+            rtol=rtol,
+            atol=atol,
+            **options
         )
-        return sol
\ No newline at end of file
+        if report is not None:
+            report.add_time('integration', time.perf_counter() - start)
+            report.counters.update(nfev=int(sol.nfev), njev=int(sol.njev), nlu=int(sol.nlu))
+        if max_jacobi_drift is not None and sol.status == 1:
+            sol.message = (f"Дрейф постоянной Якоби превысил {max_jacobi_drift:g} "
+                           f"при t={sol.t_events[0][0]:.6g}")
+        if dense:
+            return LazyTrajectory(sol)
+        sol.jacobi = self.jacobi_drift(sol.y, mu, C0)
+        return sol
+
+    def _jacobi_event(self, C0, max_drift):
+        """Событие solve_ivp: отклонение C от C0 достигло max_drift"""
+        def event(t, state, mu):
+            return max_drift - abs(self.jacobi_constant(state, mu) - C0)
+        event.terminal = True
+        event.direction = -1
+        return event
+
+    def propagate_stm(self, init_states, t_span, mu, method='DOP853',
+                      rtol=1e-12, atol=1e-12, events=None, t_eval=None):
+        """Решение системы вместе с матрицей перехода состояния
+
+        Returns:
+            результат solve_ivp, у которого y - траектория (4, n), а
+            stm - матрицы перехода (n, 4, 4) в те же моменты времени; для
+            событий аналогично y_events и stm_events
+        """
+        z0 = np.concatenate([np.asarray(init_states, dtype=float), np.eye(4).ravel()])
+        sol = solve_ivp(self.variational_equations, t_span, z0, method=method,
+                        t_eval=t_eval, args=(mu,), rtol=rtol, atol=atol, events=events)
+
+        sol.stm = sol.y[4:].T.reshape(-1, 4, 4)
+        sol.y = sol.y[:4]
+        if sol.t_events is not None:
+            sol.stm_events = [z[:, 4:].reshape(-1, 4, 4) for z in sol.y_events]
+            sol.y_events = [z[:, :4] for z in sol.y_events]
+        return sol
+
+    def make_stepper(self, init_states, method, t_span, mu,
+                     rtol=RTOL, atol=ATOL):
+        """Создание пошагового решателя scipy для системы уравнений"""
+        if method not in self.STEPPERS:
+            raise ValueError(f"Неизвестный метод решения: {method}")
+
+        options = {}
+        if method in self.IMPLICIT_METHODS:
+            options['jac'] = lambda t, state: self.jacobian(t, state, mu)
+
+        return self.STEPPERS[method](
+            lambda t, state: self.equations(t, state, mu),
+            t_span[0], np.asarray(init_states, dtype=float), t_span[1],
+            rtol=rtol, atol=atol, **options
+        )
+
+    def iter_solution(self, init_states, method, t_span, t_eval, mu,
+                      chunk_size=10000, max_steps_per_chunk=500,
+                      rtol=RTOL, atol=ATOL, report=None):
+        """Пошаговое решение системы с выдачей результата фрагментами
+
+        Генератор выдает кортежи (t_current, t_chunk, y_chunk), где
+        t_current - достигнутое время, а t_chunk и y_chunk - точки t_eval,
+        пройденные с предыдущей выдачи. Фрагмент выдается, когда накоплено
+        chunk_size точек или сделано max_steps_per_chunk шагов, поэтому
+        между выдачами можно проверять отмену и обновлять прогресс.
+
+        В отчет report (Instrumentation.RunReport) записываются принятые
+        шаги, счетчики вычислений и время фазы 'sampling'. Отвергнутые шаги
+        считаются только для явных методов Рунге-Кутты, у которых каждая
+        попытка шага стоит n_stages вычислений правой части.
+        """
+        stepper = self.make_stepper(init_states, method, t_span, mu, rtol, atol)
+        n_stages = getattr(stepper, 'n_stages', None)
+        t_eval = np.asarray(t_eval, dtype=float)
+
+        next_eval = np.searchsorted(t_eval, t_span[0], side='left')
+        pending_t, pending_y = [], []
+        n_pending = 0
+        steps = 0
+
+        while stepper.status == 'running':
+            nfev = stepper.nfev
+            stepper.step()
+            if report is not None:
+                report.record_stepper(stepper)
+            if stepper.status == 'failed':
+                raise RuntimeError(f"Ошибка интегрирования при t={stepper.t:.6g}")
+            steps += 1
+            if report is not None:
+                rejected = None if n_stages is None else (stepper.nfev - nfev) // n_stages - 1
+                report.record_step(stepper.t, stepper.t - stepper.t_old, rejected)
+
+            last_eval = np.searchsorted(t_eval, stepper.t, side='right')
+            if last_eval > next_eval:
+                start = time.perf_counter()
+                t_points = t_eval[next_eval:last_eval]
+                pending_t.append(t_points)
+                pending_y.append(stepper.dense_output()(t_points))
+                n_pending += t_points.size
+                next_eval = last_eval
+                if report is not None:
+                    report.add_time('sampling', time.perf_counter() - start)
+
+            if n_pending >= chunk_size or steps >= max_steps_per_chunk \
+                    or stepper.status != 'running':
+                if pending_t:
+                    t_chunk = np.concatenate(pending_t)
+                    y_chunk = np.concatenate(pending_y, axis=1)
+                else:
+                    t_chunk, y_chunk = np.empty(0), np.empty((4, 0))
+                yield stepper.t, t_chunk, y_chunk
+                pending_t, pending_y = [], []
+                n_pending = 0
+                steps = 0
+
+    def solve_ensemble(self, init_states, method, t_span, t_eval, mu,
+                       batch_size=4096, collision_radius=1e-6, escape_radius=None,
+                       rtol=RTOL, atol=ATOL):
+        """Совместное решение системы для набора начальных условий
+
+        Для методов RK45 и DOP853 все траектории интегрируются одновременно
+        векторизованной схемой Рунге-Кутты, при этом шаг выбирается для
+        каждой траектории отдельно, и близкое прохождение одной орбиты у
+        тела не замедляет остальные. Прочие методы решаются поочередно.
+
+        Args:
+            init_states: массив начальных условий формы (N, 4)
+            mu: массовый параметр, скаляр или массив длины N
+            batch_size: число траекторий, интегрируемых одновременно
+            collision_radius: расстояние до тела, при котором траектория
+                считается столкнувшейся и исключается из интегрирования
+            escape_radius: расстояние от начала координат, при удалении на
+                которое траектория считается ушедшей (только для RK45 и
+                DOP853); по умолчанию не проверяется
+
+        Returns:
+            EnsembleResult с траекториями формы (N, 4, len(t_eval))
+        """
+        init_states = np.atleast_2d(np.asarray(init_states, dtype=float))
+        if init_states.ndim != 2 or init_states.shape[1] != 4:
+            raise ValueError("Начальные условия должны иметь форму (N, 4)")
+        if t_span[1] <= t_span[0]:
+            raise ValueError("Интервал интегрирования должен быть возрастающим")
+        n = init_states.shape[0]
+        mu = np.broadcast_to(np.asarray(mu, dtype=float), (n,)).copy()
+        t_eval = np.asarray(t_eval, dtype=float)
+
+        y = np.full((n, 4, t_eval.size), np.nan)
+        success = np.zeros(n, dtype=bool)
+        outcome = np.full(n, EnsembleResult.FAILED, dtype=np.int8)
+        messages = [""] * n
+
+        for start in range(0, n, batch_size):
+            batch = slice(start, min(start + batch_size, n))
+            if method in self.ENSEMBLE_METHODS:
+                self._solve_batch_rk(init_states[batch], mu[batch], method,
+                                     t_span, t_eval, collision_radius,
+                                     escape_radius, rtol, atol, y[batch],
+                                     success[batch], outcome[batch],
+                                     messages, start)
+            else:
+                self._solve_batch_serial(init_states[batch], mu[batch], method,
+                                         t_span, t_eval, rtol, atol, y[batch],
+                                         success[batch], messages, start)
+                outcome[batch] = np.where(success[batch], EnsembleResult.COMPLETED,
+                                          EnsembleResult.FAILED)
+
+        return EnsembleResult(t_eval, y, mu, success, messages, outcome)
+
+    def _solve_batch_serial(self, init_states, mu, method, t_span, t_eval,
+                            rtol, atol, y_out, success_out, messages, offset):
+        """Поочередное решение траекторий пакета через solve_system"""
+        for i in range(init_states.shape[0]):
+            try:
+                sol = self.solve_system(init_states[i], method, t_span,
+                                        t_eval, mu[i], rtol, atol)
+            except Exception as e:
+                messages[offset + i] = str(e)
+                continue
+            y_out[i, :, :sol.t.size] = sol.y
+            # LSODA сообщает об успехе и при NaN в решении, например если
+            # траектория начинается в теле
+            if sol.success and not np.isfinite(sol.y).all():
+                messages[offset + i] = "Решение содержит нечисловые значения"
+                continue
+            success_out[i] = sol.success
+            messages[offset + i] = sol.message
+
+    def _solve_batch_rk(self, init_states, mu, method, t_span, t_eval,
+                        collision_radius, escape_radius, rtol, atol, y_out,
+                        success_out, outcome_out, messages, offset):
+        """Векторизованная схема Дормана-Принса с шагом для каждой траектории
+
+        Шаги делает integrate_lanes; здесь точки t_eval внутри принятых
+        шагов заполняются интерполяцией solve_ivp, а траектории, столкнувшиеся
+        с телом или ушедшие, исключаются. Результаты записываются в y_out
+        формы (m, 4, len(t_eval)).
+        """
+        tableau = self.ENSEMBLE_METHODS[method]
+        next_eval = np.full(init_states.shape[0],
+                            np.searchsorted(t_eval, float(t_span[0]), side='left'))
+        rc_sq = collision_radius ** 2
+
+        def on_step(step):
+            accepted, idx, y_new = step.accepted, step.idx, step.y_new
+            mu_act, = step.args
+
+            # Траектории, которые больше нельзя продолжать
+            dx1 = y_new[0] + mu_act
+            dx2 = dx1 - 1.0
+            y2 = y_new[1] ** 2
+            hit1 = accepted & (dx1 * dx1 + y2 < rc_sq)
+            hit2 = accepted & (dx2 * dx2 + y2 < rc_sq)
+            if escape_radius is None:
+                escaped = np.zeros(idx.size, dtype=bool)
+            else:
+                escaped = accepted & (y_new[0] ** 2 + y2 > escape_radius ** 2)
+
+            # Запись точек t_eval, попавших в принятый шаг
+            last_eval = np.searchsorted(t_eval, step.t_new, side='right')
+            lane_next = next_eval[idx]
+            counts = np.where(accepted & ~step.broken, last_eval - lane_next, 0)
+            if counts.any():
+                self._write_dense_output(tableau, method, step.K, step.t, step.h,
+                                         step.y, y_new, step.f, step.f_new, mu_act,
+                                         t_eval, lane_next, counts, idx, y_out)
+            next_eval[idx] = np.where(accepted, last_eval, lane_next)
+
+            t = np.where(accepted, step.t_new, step.t)
+            finished = step.finished
+            for mask, code, text in (
+                    (step.broken, EnsembleResult.FAILED, "Решение расходится при t={:.6g}"),
+                    (step.too_small, EnsembleResult.FAILED,
+                     "Шаг стал слишком малым при t={:.6g}"),
+                    (escaped, EnsembleResult.ESCAPE, "Уход от тел при t={:.6g}"),
+                    (hit1, EnsembleResult.COLLISION_M1, "Столкновение с M1 при t={:.6g}"),
+                    (hit2, EnsembleResult.COLLISION_M2, "Столкновение с M2 при t={:.6g}")):
+                for j in np.flatnonzero(mask & ~finished):
+                    messages[offset + idx[j]] = text.format(t[j])
+                    outcome_out[idx[j]] = code
+            for j in np.flatnonzero(finished):
+                success_out[idx[j]] = True
+                outcome_out[idx[j]] = EnsembleResult.COMPLETED
+                messages[offset + idx[j]] = "Интегрирование успешно завершено"
+            return escaped | hit1 | hit2
+
+        integrate_lanes(self.equations_ensemble, init_states.T, t_span, tableau,
+                        rtol, atol, on_step, args=(mu,))
+
+    def _write_dense_output(self, tableau, method, K, t, h, y, y_new, f, f_new,
+                            mu_act, t_eval, next_eval, counts, idx, y_out):
+        """Интерполяция решения на точки t_eval внутри принятых шагов"""
+        lanes = np.flatnonzero(counts)
+        lane_counts = counts[lanes]
+        pair_lane = np.repeat(lanes, lane_counts)
+        first = np.cumsum(lane_counts) - lane_counts
+        pair_eval = (np.repeat(next_eval[lanes] - first, lane_counts)
+                     + np.arange(pair_lane.size))
+        sigma = (t_eval[pair_eval] - t[pair_lane]) / h[pair_lane]
+        pos = np.searchsorted(lanes, pair_lane)
+
+        Kl = K[:, :, lanes]
+        hl = h[lanes]
+        if method == 'DOP853':
+            # Дополнительные стадии интерполянта 7-го порядка
+            K_ext = np.empty((tableau.A_EXTRA.shape[1], 4, lanes.size))
+            K_ext[:Kl.shape[0]] = Kl
+            for s_i, a in enumerate(tableau.A_EXTRA, start=Kl.shape[0]):
+                dy = np.einsum('skm,s->km', K_ext[:s_i], a[:s_i]) * hl
+                K_ext[s_i] = self.equations_ensemble(0.0, y[:, lanes] + dy,
+                                                     mu_act[lanes])
+            delta_y = y_new[:, lanes] - y[:, lanes]
+            F = np.empty((3 + tableau.D.shape[0], 4, lanes.size))
+            F[0] = delta_y
+            F[1] = hl * f[:, lanes] - delta_y
+            F[2] = 2 * delta_y - hl * (f_new[:, lanes] + f[:, lanes])
+            F[3:] = np.einsum('ds,skm->dkm', tableau.D, K_ext) * hl
+
+            values = np.zeros((4, pair_lane.size))
+            for i, coeff in enumerate(F[::-1]):
+                values += coeff[:, pos]
+                values *= sigma if i % 2 == 0 else 1 - sigma
+            values += y[:, pair_lane]
+        else:
+            Q = np.einsum('skm,sp->kmp', Kl, tableau.P)
+            powers = np.cumprod(np.tile(sigma, (Q.shape[2], 1)), axis=0)
+            values = y[:, pair_lane] + h[pair_lane] * np.einsum(
+                'knp,pn->kn', Q[:, pos, :], powers)
+
+        y_out[idx[pair_lane], :, pair_eval] = values.T
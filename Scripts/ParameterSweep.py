@@ -0,0 +1,205 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from MethodsForSolving import ThreeBodySolver, integrate_lanes
+from ResultStorage import prepare_output_dir, save_npz
+
+
+# Доли шага, в которых положение восполняется кубическим многочленом Эрмита
+# по концам шага (положения и скорости) при поиске наибольшего сближения
+_STEP_FRACTIONS = np.linspace(0.0, 1.0, 9)[1:]
+
+
+def _step_positions(step, lanes):
+    """Положения (x, y) внутри принятых шагов траекторий lanes, форма (S, 2, m)"""
+    s = _STEP_FRACTIONS[:, None, None]
+    h = step.h[lanes]
+    p0, p1 = step.y[:2, lanes], step.y_new[:2, lanes]
+    v0, v1 = step.f[:2, lanes] * h, step.f_new[:2, lanes] * h
+    return ((2 * s ** 3 - 3 * s ** 2 + 1) * p0 + (s ** 3 - 2 * s ** 2 + s) * v0
+            + (3 * s ** 2 - 2 * s ** 3) * p1 + (s ** 3 - s ** 2) * v1)
+
+
+def _run_chunk(output_dir, index, init_states, mu, method, t_max, escape_radius):
+    """Расчет одного фрагмента сетки параметров в процессе-исполнителе
+
+    Траектории не сохраняются: сводные показатели обновляются после каждого
+    принятого шага integrate_lanes по положениям внутри шага (см.
+    _step_positions), поэтому сближения между точками вывода не пропускаются.
+    """
+    n = init_states.shape[0]
+    final_state = np.full((n, 4), np.nan)
+    success = np.zeros(n, dtype=bool)
+
+    x, y = init_states[:, 0], init_states[:, 1]
+    min_r1 = np.hypot(x + mu, y)
+    min_r2 = np.hypot(x - 1 + mu, y)
+    escaped = np.hypot(x, y) > escape_radius
+
+    def on_step(step):
+        idx, y_new = step.idx, step.y_new
+        mu_act, = step.args
+        ok = step.accepted & ~step.broken
+
+        r1 = np.hypot(y_new[0] + mu_act, y_new[1])
+        r2 = np.hypot(y_new[0] - 1 + mu_act, y_new[1])
+        lanes = idx[ok]
+        x, y = _step_positions(step, ok).transpose(1, 0, 2)
+        mu_ok = mu_act[ok]
+        min_r1[lanes] = np.minimum(min_r1[lanes], np.hypot(x + mu_ok, y).min(axis=0))
+        min_r2[lanes] = np.minimum(min_r2[lanes], np.hypot(x - 1 + mu_ok, y).min(axis=0))
+        escaped[lanes] |= np.hypot(x, y).max(axis=0) > escape_radius
+
+        done = step.finished & ~step.broken
+        final_state[idx[done]] = y_new[:, done].T
+        success[idx[done]] = True
+        # Столкнувшиеся с телом траектории исключаются, как в solve_ensemble
+        return ok & (np.minimum(r1, r2) < ParameterSweep.COLLISION_RADIUS)
+
+    integrate_lanes(ThreeBodySolver.equations_ensemble, init_states.T, (0.0, t_max),
+                    ThreeBodySolver.ENSEMBLE_METHODS[method], ThreeBodySolver.RTOL,
+                    ThreeBodySolver.ATOL, on_step, args=(mu,))
+
+    save_npz(os.path.join(output_dir, ParameterSweep.CHUNK_NAME.format(index)),
+             final_state=final_state, escaped=escaped,
+             min_r1=min_r1, min_r2=min_r2, success=success)
+    return index
+
+
+class ParameterSweep:
+    """Перебор сетки параметров (μ, x₀, v₀) в пуле процессов
+
+    Сетка делится на фрагменты по chunk_size траекторий. Каждый фрагмент
+    решается векторизованно (методы RK45 и DOP853, см. integrate_lanes) и
+    сохраняется в отдельный файл, поэтому прерванный перебор продолжается
+    с первого несохраненного фрагмента.
+    """
+
+    MANIFEST_NAME = 'sweep.json'
+    CHUNK_NAME = 'chunk_{:06d}.npz'
+
+    # Расстояние до тела, при котором траектория считается столкнувшейся
+    COLLISION_RADIUS = 1e-6
+
+    def __init__(self, output_dir, mu_values, x0_values, v0_values,
+                 y0=0.0, u0=0.0, method='DOP853', t_max=30.0,
+                 chunk_size=256, escape_radius=5.0):
+        if method not in ThreeBodySolver.ENSEMBLE_METHODS:
+            raise ValueError(f"Метод {method} не поддерживается: перебор параметров "
+                             f"использует {', '.join(ThreeBodySolver.ENSEMBLE_METHODS)}")
+        self.output_dir = output_dir
+        self.mu_values = np.atleast_1d(np.asarray(mu_values, dtype=float))
+        self.x0_values = np.atleast_1d(np.asarray(x0_values, dtype=float))
+        self.v0_values = np.atleast_1d(np.asarray(v0_values, dtype=float))
+        self.y0 = float(y0)
+        self.u0 = float(u0)
+        self.method = method
+        self.t_max = float(t_max)
+        self.chunk_size = int(chunk_size)
+        self.escape_radius = float(escape_radius)
+
+    @property
+    def size(self):
+        """Общее число траекторий в сетке"""
+        return self.mu_values.size * self.x0_values.size * self.v0_values.size
+
+    @property
+    def n_chunks(self):
+        """Число фрагментов сетки"""
+        return -(-self.size // self.chunk_size)
+
+    def grid(self):
+        """Значения (μ, x₀, v₀) для всех узлов сетки"""
+        mu, x0, v0 = np.meshgrid(self.mu_values, self.x0_values,
+                                 self.v0_values, indexing='ij')
+        return mu.ravel(), x0.ravel(), v0.ravel()
+
+    def manifest(self):
+        """Описание перебора для проверки при возобновлении"""
+        return {
+            'mu_values': self.mu_values.tolist(),
+            'x0_values': self.x0_values.tolist(),
+            'v0_values': self.v0_values.tolist(),
+            'y0': self.y0,
+            'u0': self.u0,
+            'method': self.method,
+            't_max': self.t_max,
+            'chunk_size': self.chunk_size,
+            'escape_radius': self.escape_radius
+        }
+
+    def pending_chunks(self):
+        """Номера фрагментов, результаты которых еще не сохранены"""
+        return [i for i in range(self.n_chunks)
+                if not os.path.exists(self._chunk_path(i))]
+
+    def run(self, workers=None, progress=None):
+        """Запуск (или продолжение) перебора
+
+        Args:
+            workers: число процессов, по умолчанию - все ядра
+            progress: функция progress(done, total), вызываемая после
+                сохранения каждого фрагмента
+
+        Returns:
+            число фрагментов, рассчитанных при этом запуске
+        """
+        prepare_output_dir(self.output_dir, self.MANIFEST_NAME, self.manifest())
+        pending = self.pending_chunks()
+        done = self.n_chunks - len(pending)
+        if not pending:
+            return 0
+
+        mu, x0, v0 = self.grid()
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            futures = []
+            for index in pending:
+                part = slice(index * self.chunk_size,
+                             (index + 1) * self.chunk_size)
+                n = x0[part].size
+                init_states = np.column_stack([
+                    x0[part], np.full(n, self.y0), np.full(n, self.u0), v0[part]
+                ])
+                futures.append(pool.submit(
+                    _run_chunk, self.output_dir, index, init_states, mu[part],
+                    self.method, self.t_max, self.escape_radius
+                ))
+
+            for future in as_completed(futures):
+                future.result()
+                done += 1
+                if progress is not None:
+                    progress(done, self.n_chunks)
+
+        return len(pending)
+
+    def load_results(self):
+        """Чтение сохраненных результатов в виде таблицы столбцов
+
+        Незавершенные фрагменты пропускаются, поэтому таблицу можно
+        читать и во время перебора.
+        """
+        mu, x0, v0 = self.grid()
+        parts = {name: [] for name in ('final_state', 'escaped', 'min_r1',
+                                       'min_r2', 'success')}
+        indices = []
+
+        for index in range(self.n_chunks):
+            path = self._chunk_path(index)
+            if not os.path.exists(path):
+                continue
+            with np.load(path) as data:
+                for name in parts:
+                    parts[name].append(data[name])
+            indices.append(np.arange(index * self.chunk_size,
+                                     min((index + 1) * self.chunk_size, self.size)))
+
+        rows = np.concatenate(indices) if indices else np.empty(0, dtype=int)
+        table = {'mu': mu[rows], 'x0': x0[rows], 'v0': v0[rows]}
+        for name, values in parts.items():
+            table[name] = np.concatenate(values) if values else np.empty(0)
+        return table
+
+    def _chunk_path(self, index):
+        return os.path.join(self.output_dir, self.CHUNK_NAME.format(index))
@@ -0,0 +1,240 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.optimize import OptimizeResult
+from MethodsForSolving import ThreeBodySolver
+
+
+def _run_family(family, n_orbits):
+    """Продолжение одного семейства в процессе-исполнителе"""
+    return family.continuation(n_orbits)
+
+
+def lyapunov_families(mu, points=(1, 2, 3), n_orbits=50, workers=None, **options):
+    """Семейства орбит Ляпунова около нескольких точек Лагранжа
+
+    Семейства продолжаются независимо, каждое в своем процессе.
+
+    Args:
+        points: номера коллинеарных точек (1, 2, 3)
+        options: параметры LyapunovFamily
+
+    Returns:
+        словарь {номер точки: результат LyapunovFamily.continuation}
+    """
+    families = [LyapunovFamily(mu, point, **options) for point in points]
+    with ProcessPoolExecutor(max_workers=workers or min(len(families), os.cpu_count())) as pool:
+        results = pool.map(_run_family, families, [n_orbits] * len(families))
+        return dict(zip(points, results))
+
+
+def save_family(path, family):
+    """Сохранение семейства орбит в .npz"""
+    np.savez(path, **{name: np.asarray(value) for name, value in family.items()})
+
+
+class LyapunovFamily:
+    """Семейство плоских орбит Ляпунова около коллинеарной точки Лагранжа
+
+    Орбиты симметричны относительно оси x: начинаются на оси
+    перпендикулярно ей, в состоянии (x₀, 0, 0, v₀), и через половину периода
+    снова пересекают ось перпендикулярно (u = 0). Условие периодичности
+    F(x₀, v₀) = u(T/2) = 0 решается методом Ньютона с производными из
+    матрицы перехода состояния, а семейство строится продолжением по
+    псевдодлине дуги в плоскости (x₀, v₀), начиная с малой орбиты из
+    линейного приближения около точки Лагранжа.
+    """
+
+    def __init__(self, mu, point=1, step=1e-2, amplitude=1e-3, tol=1e-11,
+                 max_iter=12, t_max=20.0, collision_radius=1e-3,
+                 rtol=1e-12, atol=1e-12):
+        """
+        Args:
+            mu: массовый параметр
+            point: номер коллинеарной точки Лагранжа (1, 2, 3)
+            step: наибольший шаг продолжения по псевдодлине дуги
+            amplitude: амплитуда начальной орбиты по x
+            tol: допуск на |u(T/2)|
+            max_iter: предельное число итераций Ньютона для одной орбиты
+            t_max: предельное время поиска половины периода
+            collision_radius: сближение с телом, на котором продолжение
+                прекращается
+        """
+        if point not in (1, 2, 3):
+            raise ValueError("Орбиты Ляпунова строятся около точек L1, L2, L3")
+        self.mu = float(mu)
+        self.point = point
+        self.step = float(step)
+        self.amplitude = float(amplitude)
+        self.tol = tol
+        self.max_iter = max_iter
+        self.t_max = t_max
+        self.collision_radius = collision_radius
+        self.rtol = rtol
+        self.atol = atol
+
+    def lagrange_point(self):
+        """Абсцисса точки Лагранжа, около которой строится семейство"""
+        return ThreeBodySolver.get_lagrange_points_simple(self.mu)[self.point - 1]
+
+    def seed(self):
+        """Начальное приближение малой орбиты из линеаризации около точки
+
+        Решение линейной системы x = -A cos(st), y = βA sin(st); начальная
+        точка берется со стороны, противоположной ближайшему телу.
+
+        Returns:
+            (x₀, v₀, период)
+        """
+        x_l = self.lagrange_point()
+        a = ThreeBodySolver.jacobian(0.0, [x_l, 0.0], self.mu)
+        omega_xx, omega_yy = a[2, 0], a[3, 1]
+
+        b1 = 2 - (omega_xx + omega_yy) / 2
+        b2 = np.sqrt(-omega_xx * omega_yy)
+        s = np.sqrt(b1 + np.sqrt(b1 * b1 + b2 * b2))
+        beta = (s * s + omega_xx) / (2 * s)
+
+        side = 1.0 if self.point == 2 else -1.0
+        amplitude = side * self.amplitude
+        return x_l + amplitude, -beta * s * amplitude, 2 * np.pi / s
+
+    def half_period(self, x0, v0):
+        """Интегрирование до следующего пересечения оси y = 0
+
+        Returns:
+            (F, grad, t_half, sol): F = u(T/2), grad = (∂F/∂x₀, ∂F/∂v₀) с
+            учетом изменения момента пересечения, sol - результат
+            propagate_stm с траекторией до пересечения
+        """
+        def crossing(t, z, mu):
+            return z[1]
+        crossing.terminal = True
+        crossing.direction = -np.sign(v0)
+
+        sol = ThreeBodySolver().propagate_stm([x0, 0.0, 0.0, v0], (0.0, self.t_max),
+                                              self.mu, rtol=self.rtol, atol=self.atol,
+                                              events=crossing)
+        if sol.status != 1:
+            raise RuntimeError(f"Пересечение оси y = 0 не найдено за t={self.t_max}")
+        if self._min_distance(sol.y) < self.collision_radius:
+            raise RuntimeError("Орбита проходит слишком близко к телу")
+
+        t_half = float(sol.t_events[0][0])
+        state = sol.y_events[0][0]
+        phi = sol.stm_events[0][0]
+        rates = ThreeBodySolver.equations(t_half, state, self.mu)
+
+        # Момент пересечения зависит от начальных условий: δt = -δy / ẏ
+        columns = [0, 3]
+        grad = phi[2, columns] - rates[2] * phi[1, columns] / rates[1]
+        sol.half_stm = phi
+        sol.grad = grad
+        return state[2], grad, t_half, sol
+
+    def correct(self, x0, v0):
+        """Дифференциальная коррекция v₀ при фиксированном x₀
+
+        Returns:
+            орбита (см. _orbit)
+        """
+        for iteration in range(1, self.max_iter + 1):
+            f, grad, t_half, sol = self.half_period(x0, v0)
+            if abs(f) < self.tol:
+                return self._orbit(x0, v0, t_half, sol, iteration)
+            v0 -= f / grad[1]
+        raise RuntimeError("Дифференциальная коррекция не сошлась")
+
+    def continuation(self, n_orbits):
+        """Построение семейства продолжением по псевдодлине дуги
+
+        Каждая следующая орбита предсказывается по касательной к кривой
+        F(x₀, v₀) = 0 и уточняется методом Ньютона для системы из F = 0 и
+        условия ортогональности поправки касательной. При неудаче шаг
+        уменьшается вдвое; продолжение заканчивается, когда шаг становится
+        меньше 10⁻⁴ от наибольшего (обычно при сближении орбиты с телом).
+
+        Returns:
+            OptimizeResult с массивами по орбитам семейства: init_states
+            (n, 4), period, jacobi, stability, iterations; а также mu, point
+        """
+        x0, v0, _ = self.seed()
+        orbit = self.correct(x0, v0)
+        orbits = [orbit]
+
+        z = np.array([orbit.init_states[0], orbit.init_states[3]])
+        tangent = self._tangent(orbit.grad, np.array([self.amplitude, 0.0]) *
+                                (1.0 if self.point == 2 else -1.0))
+        ds = self.step
+
+        while len(orbits) < n_orbits and ds >= 1e-4 * self.step:
+            try:
+                orbit = self._correct_arclength(z + ds * tangent, tangent)
+            except RuntimeError:
+                ds /= 2
+                continue
+
+            orbits.append(orbit)
+            z = np.array([orbit.init_states[0], orbit.init_states[3]])
+            tangent = self._tangent(orbit.grad, tangent)
+            if orbit.iterations <= 3:
+                ds = min(2 * ds, self.step)
+
+        return OptimizeResult(
+            mu=self.mu,
+            point=self.point,
+            init_states=np.array([o.init_states for o in orbits]),
+            period=np.array([o.period for o in orbits]),
+            jacobi=np.array([o.jacobi for o in orbits]),
+            stability=np.array([o.stability for o in orbits]),
+            iterations=np.array([o.iterations for o in orbits])
+        )
+
+    def _correct_arclength(self, z, tangent):
+        """Метод Ньютона для F(z) = 0, tangent·(z - z_pred) = 0"""
+        z_pred = z.copy()
+        for iteration in range(1, self.max_iter + 1):
+            f, grad, t_half, sol = self.half_period(*z)
+            if abs(f) < self.tol:
+                return self._orbit(z[0], z[1], t_half, sol, iteration)
+            system = np.array([grad, tangent])
+            residual = np.array([f, tangent @ (z - z_pred)])
+            z = z - np.linalg.solve(system, residual)
+        raise RuntimeError("Коррекция по псевдодлине дуги не сошлась")
+
+    @staticmethod
+    def _tangent(grad, previous):
+        """Касательная к кривой F = 0, сонаправленная предыдущей"""
+        tangent = np.array([-grad[1], grad[0]])
+        tangent /= np.linalg.norm(tangent)
+        return tangent if tangent @ previous >= 0 else -tangent
+
+    def _orbit(self, x0, v0, t_half, sol, iterations):
+        """Описание найденной периодической орбиты
+
+        Матрица монодромии восстанавливается по половине периода из
+        симметрии относительно оси x: M = G Φ⁻¹ G Φ, G = diag(1, -1, -1, 1).
+        Индекс устойчивости (|λ| + 1/|λ|)/2 для наибольшего собственного
+        значения M; орбита устойчива при индексе, близком к 1.
+        """
+        init_states = np.array([x0, 0.0, 0.0, v0])
+        phi = sol.half_stm
+        g = np.diag([1.0, -1.0, -1.0, 1.0])
+        monodromy = g @ np.linalg.solve(phi, g @ phi)
+        largest = np.abs(np.linalg.eigvals(monodromy)).max()
+
+        return OptimizeResult(
+            init_states=init_states,
+            period=2 * t_half,
+            jacobi=float(ThreeBodySolver.jacobi_constant(init_states, self.mu)),
+            stability=(largest + 1 / largest) / 2,
+            monodromy=monodromy,
+            iterations=iterations,
+            grad=sol.grad
+        )
+
+    def _min_distance(self, y):
+        """Наименьшее расстояние траектории до тел"""
+        x, yy = y[0], y[1]
+        return min(np.hypot(x + self.mu, yy).min(), np.hypot(x - 1 + self.mu, yy).min())
@@ -1,12 +1,34 @@
+import math
+import time
+
+import matplotlib
 import numpy as np
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
-from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout)
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
+                             QPushButton, QDoubleSpinBox)
+from Instrumentation import RunReport
 from MethodsForSolving import ThreeBodySolver
+from Decimation import decimate_path, view_geometry
 
 
 class OrbitPlotWindow(QMainWindow):
-    """Окно для визуализации орбиты"""
+    """Окно для визуализации орбиты
+
+    Построенную траекторию можно воспроизвести: движущееся тело и его след
+    перерисовываются поверх сохраненного изображения неподвижной части
+    графика (blitting), поэтому кадр не зависит от числа точек траектории,
+    а время воспроизведения идет по часам, а не по номерам точек.
+    """
+
+    # Воспроизведение: частота кадров, длительность показа всей траектории
+    # по умолчанию (с), длина следа в долях длительности траектории и
+    # наибольшее число точек следа на кадре
+    FRAME_RATE = 30
+    PLAYBACK_SECONDS = 10.0
+    TRAIL_FRACTION = 0.02
+    TRAIL_POINTS = 400
 
     def __init__(self):
         super().__init__()
@@ -22,7 +44,56 @@ class OrbitPlotWindow(QMainWindow):
         self.canvas = FigureCanvas(self.figure)
         layout.addWidget(self.canvas)
 
-    def plot_orbit(self, sol, mu, init_states, method, center_point=(0, 0), bounds=(1.5, 1.0)):
+        # Управление воспроизведением
+        controls = QHBoxLayout()
+        self.play_button = QPushButton("Воспроизвести")
+        self.play_button.setEnabled(False)
+        self.play_button.clicked.connect(self.toggle_animation)
+        controls.addWidget(self.play_button)
+
+        controls.addWidget(QLabel("Скорость (единиц времени в секунду):"))
+        self.speed_input = QDoubleSpinBox()
+        self.speed_input.setRange(0.001, 1e5)
+        self.speed_input.setDecimals(3)
+        self.speed_input.setValue(3.0)
+        controls.addWidget(self.speed_input)
+
+        self.time_label = QLabel()
+        controls.addWidget(self.time_label)
+        controls.addStretch()
+        layout.addLayout(controls)
+
+        # Последняя построенная траектория в полном разрешении; на графике
+        # показывается только ее прореженная видимая часть
+        self.trajectory = None
+        self.times = None
+        self.orbit_ax = None
+        self.orbit_line = None
+        self.view = ((0, 0), (1.5, 1.0))
+
+        # Изменяемые элементы графика орбиты (см. update_orbit) и параметры,
+        # при которых неподвижные элементы остаются верными
+        self.start_marker = None
+        self.end_marker = None
+        self.zero_velocity_artists = []
+        self._zero_velocity = None  # (mu, C, полуширина сетки 2Ω)
+        self._plot_key = None
+
+        # Анимированные элементы (рисуются только при воспроизведении) и
+        # изображение неподвижной части графика под ними
+        self.body_marker = None
+        self.trail_line = None
+        self._background = None
+        self._play_time = 0.0
+        self._last_frame = None
+        self.animation_timer = QTimer(self)
+        self.animation_timer.setTimerType(Qt.PreciseTimer)
+        self.animation_timer.setInterval(int(1000 / self.FRAME_RATE))
+        self.animation_timer.timeout.connect(self._animation_frame)
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def plot_orbit(self, sol, mu, init_states, method, center_point=(0, 0), bounds=(1.5, 1.0),
+                   report=None):
         """Построение графика орбиты
 
         Args:
@@ -32,7 +103,59 @@ class OrbitPlotWindow(QMainWindow):
             method: метод интегрирования
             center_point: центральная точка графика (x_center, y_center)
             bounds: размеры границ по ox и oy (x_bound, y_bound)
+            report: отчет о запуске (Instrumentation.RunReport), в который
+                записывается время фаз 'render' и 'lagrange'
         """
+        report = report if report is not None else RunReport()
+        self._reset_animation()
+        with report.phase('render'):
+            self._draw_orbit(sol, mu, method, center_point, bounds, report)
+        self._prepare_playback()
+
+    def update_orbit(self, sol, mu, init_states, method, center_point=(0, 0), bounds=(1.5, 1.0),
+                     report=None):
+        """Замена траектории на уже построенном графике
+
+        Тела, точки Лагранжа, оси и легенда остаются на месте; заменяются
+        линия орбиты, отметки начала и конца, кривые нулевой скорости и
+        заголовок. Так график обновляется заметно быстрее, чем при полном
+        построении. Если μ, метод или область отображения изменились,
+        график строится заново (plot_orbit).
+        """
+        if self.trajectory is None or self._plot_key != (mu, method) \
+                or self.view != (tuple(center_point), tuple(bounds)):
+            self.plot_orbit(sol, mu, init_states, method, center_point, bounds, report)
+            return
+
+        report = report if report is not None else RunReport()
+        self._reset_animation()
+        with report.phase('render'):
+            x, y = sol.y[0], sol.y[1]
+            self.trajectory = (x, y)
+            self.times = np.asarray(sol.t)
+            self.orbit_line.set_data(*self._visible_path(x, y))
+            self.start_marker.set_data([x[0]], [y[0]])
+            self.end_marker.set_data([x[-1]], [y[-1]])
+
+            for artist in self.zero_velocity_artists:
+                artist.remove()
+            jacobi = ThreeBodySolver.jacobi_drift(sol.y, mu)
+            self.zero_velocity_artists = self.plot_zero_velocity_curves(
+                self.orbit_ax, mu, jacobi.C0)
+            self.orbit_ax.set_title(self._orbit_title(mu, method, jacobi.C0, jacobi.max_drift,
+                                                      report.context.get('extended_from')))
+            self.canvas.draw()
+        self._prepare_playback()
+
+    def _prepare_playback(self):
+        """Начальный момент и скорость воспроизведения новой траектории"""
+        # Скорость по умолчанию - вся траектория за PLAYBACK_SECONDS
+        self._play_time = float(self.times[0])
+        self.speed_input.setValue((self.times[-1] - self.times[0]) / self.PLAYBACK_SECONDS)
+        self.play_button.setEnabled(len(self.times) > 1)
+
+    def _draw_orbit(self, sol, mu, method, center_point, bounds, report):
+        """Построение графика орбиты (см. plot_orbit)"""
         self.figure.clear()
 
         # Создание основного графика
@@ -42,16 +165,207 @@ class OrbitPlotWindow(QMainWindow):
         t = sol.t
 
         # Основной график орбиты
-        ax.plot(x, y, 'b-', linewidth=1, label='Траектория')
-        ax.plot(x[0], y[0], 'go', markersize=8, label='Начало')
-        ax.plot(x[-1], y[-1], 'ro', markersize=8, label='Конец')
+        self.trajectory = (x, y)
+        self.times = np.asarray(t)
+        self.orbit_ax = ax
+        self.view = (tuple(center_point), tuple(bounds))
+        self._plot_key = (mu, method)
+        self.orbit_line, = ax.plot(*self._visible_path(x, y), 'b-', linewidth=1,
+                                   label='Траектория')
+        self.start_marker, = ax.plot(x[0], y[0], 'go', markersize=8, label='Начало')
+        self.end_marker, = ax.plot(x[-1], y[-1], 'ro', markersize=8, label='Конец')
+
+        # Кривые нулевой скорости для постоянной Якоби начальной точки
+        jacobi = ThreeBodySolver.jacobi_drift(sol.y, mu)
+        self.zero_velocity_artists = self.plot_zero_velocity_curves(ax, mu, jacobi.C0)
 
         # Точки Лагранжа и массивные тела
+        with report.phase('lagrange'):
+            self.plot_lagrange_points(ax, mu)
+
+        self._decorate_axes(ax, mu, method, center_point, bounds, jacobi.C0, jacobi.max_drift,
+                            report.context.get('extended_from'))
+        self.canvas.draw()
+
+    def start_stream(self, mu, init_states, method, center_point=(0, 0), bounds=(1.5, 1.0)):
+        """Подготовка графика к выводу траектории по мере ее вычисления"""
+        self._reset_animation()
+        self.figure.clear()
+        ax = self.figure.add_subplot(111)
+
+        self._stream_x = []
+        self._stream_y = []
+        self._stream_path = ([], [])
+        self.trajectory = None
+        self.times = None
+        self.orbit_ax = ax
+        self.view = (center_point, bounds)
+        self.orbit_line, = ax.plot([], [], 'b-', linewidth=1, label='Траектория')
+        ax.plot(init_states[0], init_states[1], 'go', markersize=8, label='Начало')
+
+        C = float(ThreeBodySolver.jacobi_constant(np.asarray(init_states, dtype=float), mu))
+        self.zero_velocity_artists = self.plot_zero_velocity_curves(ax, mu, C)
         self.plot_lagrange_points(ax, mu)
 
+        self._decorate_axes(ax, mu, method, center_point, bounds, C)
+        self.canvas.draw()
+
+    def append_stream(self, t_chunk, y_chunk):
+        """Добавление очередного фрагмента траектории к графику"""
+        # Фрагмент прореживается вместе с последней точкой предыдущего,
+        # поэтому отдельные фрагменты линии можно разделить NaN без разрыва
+        x, y = y_chunk[0], y_chunk[1]
+        if self._stream_x:
+            x = np.concatenate(([self._stream_x[-1][-1]], x))
+            y = np.concatenate(([self._stream_y[-1][-1]], y))
+        self._stream_x.append(y_chunk[0])
+        self._stream_y.append(y_chunk[1])
+
+        xd, yd = self._visible_path(x, y)
+        self._stream_path[0].extend(([np.nan], xd))
+        self._stream_path[1].extend(([np.nan], yd))
+        self.orbit_line.set_data(np.concatenate(self._stream_path[0]),
+                                 np.concatenate(self._stream_path[1]))
+        self.canvas.draw_idle()
+
+    def set_view(self, center_point, bounds):
+        """Изменение области отображения без повторного решения
+
+        Траектория заново прореживается для новой области, поэтому при
+        увеличении видимая часть показывается в полном разрешении.
+        """
+        if self.orbit_ax is None:
+            return
+        self.view = (center_point, bounds)
+
+        if self.trajectory is not None:
+            x, y = self.trajectory
+        elif self._stream_x:
+            x, y = np.concatenate(self._stream_x), np.concatenate(self._stream_y)
+        else:
+            x = y = np.empty(0)
+        xd, yd = self._visible_path(x, y)
+        if self.trajectory is None:
+            # Решение еще идет: следующие фрагменты дополнят эту линию
+            self._stream_path = ([xd], [yd])
+        self.orbit_line.set_data(xd, yd)
+
+        # Сетку 2Ω достаточно расширить, если видимой стала новая часть
+        # запрещенной области
+        if self._zero_velocity is not None:
+            mu, C, extent = self._zero_velocity
+            if self._grid_extent(C) > extent:
+                for artist in self.zero_velocity_artists:
+                    artist.remove()
+                self.zero_velocity_artists = self.plot_zero_velocity_curves(
+                    self.orbit_ax, mu, C)
+
+        x_center, y_center = center_point
+        x_bound, y_bound = bounds
+        self.orbit_ax.set_xlim(x_center - x_bound, x_center + x_bound)
+        self.orbit_ax.set_ylim(y_center - y_bound, y_center + y_bound)
+        self.canvas.draw_idle()
+
+    def toggle_animation(self):
+        """Запуск или пауза воспроизведения"""
+        if self.animation_timer.isActive():
+            self.stop_animation()
+        else:
+            self.start_animation()
+
+    def start_animation(self):
+        """Воспроизведение траектории с текущего момента (с начала после конца)"""
+        if self.trajectory is None or len(self.times) < 2:
+            return
+        if self.body_marker is None:
+            self.trail_line, = self.orbit_ax.plot([], [], '-', color='orange', linewidth=2.5,
+                                                  animated=True)
+            self.body_marker, = self.orbit_ax.plot([], [], 'o', color='orange', markersize=9,
+                                                   markeredgecolor='black', animated=True)
+        if self._play_time >= self.times[-1]:
+            self._play_time = float(self.times[0])
+        self._update_animated()
+
+        # Полная отрисовка сохраняет фон без анимированных элементов (_on_draw)
+        self.canvas.draw()
+        self._last_frame = time.monotonic()
+        self.animation_timer.start()
+        self.play_button.setText("Пауза")
+
+    def stop_animation(self):
+        """Пауза воспроизведения; тело остается в достигнутой точке"""
+        self.animation_timer.stop()
+        self.play_button.setText("Воспроизвести")
+
+    def _reset_animation(self):
+        """Остановка воспроизведения перед построением нового графика"""
+        self.stop_animation()
+        self.play_button.setEnabled(False)
+        self.body_marker = None
+        self.trail_line = None
+        self._background = None
+        self.time_label.clear()
+
+    def _animation_frame(self):
+        """Очередной кадр: время продвигается по часам, а не по точкам"""
+        now = time.monotonic()
+        self._play_time += (now - self._last_frame) * self.speed_input.value()
+        self._last_frame = now
+        finished = self._play_time >= self.times[-1]
+        if finished:
+            self._play_time = float(self.times[-1])
+
+        self._update_animated()
+        if self._background is not None:
+            self.canvas.restore_region(self._background)
+            self._draw_animated()
+            self.canvas.blit(self.figure.bbox)
+        if finished:
+            self.stop_animation()
+
+    def _update_animated(self):
+        """Положение тела и след за последние TRAIL_FRACTION траектории
+
+        Точки находятся двоичным поиском по времени, а след прореживается
+        до TRAIL_POINTS точек, поэтому стоимость кадра не зависит от длины
+        траектории.
+        """
+        t = self.times
+        x, y = self.trajectory
+        end = max(int(np.searchsorted(t, self._play_time, side='right')) - 1, 0)
+        trail_start = self._play_time - self.TRAIL_FRACTION * (t[-1] - t[0])
+        start = int(np.searchsorted(t, trail_start, side='left'))
+        index = np.unique(np.linspace(start, end, min(end - start + 1, self.TRAIL_POINTS),
+                                      dtype=np.int64))
+
+        self.trail_line.set_data(x[index], y[index])
+        self.body_marker.set_data([x[end]], [y[end]])
+        self.time_label.setText(f"t = {self._play_time:.3f}")
+
+    def _draw_animated(self):
+        self.orbit_ax.draw_artist(self.trail_line)
+        self.orbit_ax.draw_artist(self.body_marker)
+
+    def _on_draw(self, event):
+        """Сохранение фона после полной отрисовки (изменение размера, области)"""
+        if self.body_marker is None:
+            self._background = None
+            return
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._draw_animated()
+
+    def _visible_path(self, x, y):
+        """Прореженная под текущую область и размер окна часть траектории"""
+        bbox = self.orbit_ax.bbox
+        x_range, y_range, pixel_size = view_geometry(*self.view, bbox.width, bbox.height)
+        return decimate_path(x, y, x_range, y_range, pixel_size)
+
+    def _decorate_axes(self, ax, mu, method, center_point, bounds, C=None, drift=None,
+                       extended_from=None):
+        """Подписи, легенда и границы области отображения"""
         ax.set_xlabel('x')
         ax.set_ylabel('y')
-        ax.set_title(f'Орбита в ограниченной задаче трех тел\nμ={mu}, метод: {method}')
+        ax.set_title(self._orbit_title(mu, method, C, drift, extended_from))
         ax.grid(True, alpha=0.3)
         ax.legend()
         ax.axis('equal')
@@ -64,7 +378,50 @@ class OrbitPlotWindow(QMainWindow):
         ax.set_ylim(y_center - y_bound, y_center + y_bound)
 
         self.figure.tight_layout()
-        self.canvas.draw()
+
+    @staticmethod
+    def _orbit_title(mu, method, C=None, drift=None, extended_from=None):
+        title = f'Орбита в ограниченной задаче трех тел\nμ={mu}, метод: {method}'
+        if C is not None:
+            title += f', C={C:.6f}'
+        if drift is not None:
+            title += f', дрейф C: {drift:.1e}'
+        if extended_from is not None:
+            title += f'\nпродолжено из кэша с t={extended_from:g}'
+        return title
+
+    def plot_zero_velocity_curves(self, ax, mu, C):
+        """Кривые нулевой скорости 2Ω(x, y) = C и запрещенная область 2Ω < C
+
+        Значения 2Ω берутся из сетки, вычисленной один раз для данного μ и
+        размера сетки (см. _grid_extent).
+
+        Returns:
+            список добавленных элементов графика
+        """
+        self._zero_velocity = None
+        if not np.isfinite(C):
+            return []
+        extent = self._grid_extent(C)
+        self._zero_velocity = (mu, C, extent)
+        x, y, values = ThreeBodySolver.potential_grid(mu, extent)
+        if not values.min() < C < values.max():
+            return []
+        return [ax.contourf(x, y, values, levels=[values.min(), C], colors=['0.85'], alpha=0.6),
+                ax.contour(x, y, values, levels=[C], colors=['0.4'], linewidths=1)]
+
+    def _grid_extent(self, C):
+        """Полуширина сетки 2Ω, покрывающей видимую часть запрещенной области
+
+        Так как 2Ω > x² + y², запрещенная область 2Ω < C лежит в круге радиуса
+        √C, и сетка не должна выходить за него или за область отображения.
+        Размер округляется вверх до 0.5, чтобы небольшие сдвиги области
+        отображения не требовали новой сетки.
+        """
+        (x_center, y_center), (x_bound, y_bound) = self.view
+        view_extent = max(abs(x_center) + x_bound, abs(y_center) + y_bound)
+        extent = min(view_extent, math.sqrt(max(C, 0.0)))
+        return max(0.5, math.ceil(2 * extent) / 2)
 
     def plot_lagrange_points(self, ax, mu):
         """Отображение точек Лагранжа и массивных тел"""
@@ -74,17 +431,9 @@ class OrbitPlotWindow(QMainWindow):
         ax.text(-mu, 0.1, 'M1', ha='center', fontsize=10)
         ax.text(-mu + 1, 0.1, 'M2', ha='center', fontsize=10)
 
-        # Точки Лагранжа L1, L2, L3 (коллинеарные)
-        # Приближенные вычисления для точек Лагранжа
-        alpha = (mu / 3) ** (1/3)
-
-        L1_x, L2_x, L3_x = ThreeBodySolver.get_lagrange_points_simple(mu)
-
-        # L4 и L5 (треугольные)
-        L4_x = 0.5 - mu
-        L4_y = np.sqrt(3) / 2
-        L5_x = 0.5 - mu
-        L5_y = -np.sqrt(3) / 2
+        # Точки Лагранжа: L1, L2, L3 (коллинеарные), L4 и L5 (треугольные)
+        (L1_x, _), (L2_x, _), (L3_x, _), (L4_x, L4_y), (L5_x, L5_y) = \
+            ThreeBodySolver.get_lagrange_points(mu)
 
         # Отображение всех точек Лагранжа
         lagrange_points = [
@@ -99,4 +448,105 @@ class OrbitPlotWindow(QMainWindow):
             color = 'red' if i < 3 else 'green'  # Коллинеарные красные, треугольные зеленые
             ax.plot(lx, ly, '^', color=color, markersize=8, markeredgecolor='black')
             ax.text(lx, ly + 0.04, label, ha='center', fontsize=10,
-                    bbox=dict(boxstyle="round,pad=0.2", facecolor="white", alpha=0.7))
\ No newline at end of file
+                    bbox=dict(boxstyle="round,pad=0.2", facecolor="white", alpha=0.7))
+
+
+class PoincarePlotWindow(QMainWindow):
+    """Окно для отображения сечения Пуанкаре"""
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Сечение Пуанкаре - Ограниченная задача трех тел")
+        self.setGeometry(150, 150, 800, 600)
+
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        layout = QVBoxLayout(central_widget)
+
+        self.figure = Figure(figsize=(8, 6), dpi=100)
+        self.canvas = FigureCanvas(self.figure)
+        layout.addWidget(self.canvas)
+
+    def plot_section(self, results, mu, C, method, axes=(0, 2), labels=('x', 'u')):
+        """Построение сечения
+
+        Все точки выводятся одной коллекцией без сглаживания маркеров,
+        поэтому десятки тысяч пересечений отрисовываются быстро.
+
+        Args:
+            results: список пар (t, states) для каждой траектории
+            mu: массовый параметр
+            C: постоянная Якоби начальных условий
+            method: метод интегрирования
+            axes: номера переменных состояния по осям графика
+            labels: подписи осей
+        """
+        self.figure.clear()
+        ax = self.figure.add_subplot(111)
+
+        points = [states for _, states in results if len(states)]
+        if points:
+            states = np.concatenate(points)
+            # Цвет точки - номер траектории, чтобы отличать отдельные кривые
+            orbit = np.concatenate([np.full(len(s), i) for i, s in enumerate(points)])
+            ax.scatter(states[:, axes[0]], states[:, axes[1]], c=orbit, s=1,
+                       cmap='tab20', marker='.', linewidths=0, antialiased=False)
+            n_points = len(states)
+        else:
+            n_points = 0
+
+        ax.set_xlabel(labels[0])
+        ax.set_ylabel(labels[1])
+        ax.set_title(f'Сечение Пуанкаре y = 0, v > 0\nμ={mu}, C={C:.6f}, метод: {method}, '
+                     f'точек: {n_points}')
+        ax.grid(True, alpha=0.3)
+
+        self.figure.tight_layout()
+        self.canvas.draw()
+
+
+class ChaosMapWindow(QMainWindow):
+    """Окно для отображения карты индикаторов хаоса"""
+
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Карта хаоса - Ограниченная задача трех тел")
+        self.setGeometry(200, 200, 1000, 500)
+
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        layout = QVBoxLayout(central_widget)
+
+        self.figure = Figure(figsize=(10, 5), dpi=100)
+        self.canvas = FigureCanvas(self.figure)
+        layout.addWidget(self.canvas)
+
+    def plot_map(self, result):
+        """Построение карт FLI и MEGNO рядом
+
+        Args:
+            result: результат ChaosMap.load; узлы без значения (запрещенная
+                область, несохраненные фрагменты) показываются серым
+        """
+        self.figure.clear()
+        extent = (result.x0_values[0], result.x0_values[-1],
+                  result.second_values[0], result.second_values[-1])
+        second_label = 'v₀' if result.kind == 'v0' else 'C'
+        cmap = matplotlib.colormaps['inferno'].with_extremes(bad='0.7')
+
+        for i, (name, values) in enumerate((('FLI', result.fli), ('MEGNO ⟨Y⟩', result.megno))):
+            ax = self.figure.add_subplot(1, 2, i + 1)
+            finite = values[np.isfinite(values)]
+            # Верхняя граница шкалы по 99-му процентилю, чтобы отдельные
+            # сильно хаотичные узлы не сжимали шкалу
+            vmax = np.percentile(finite, 99) if finite.size else 1.0
+            image = ax.imshow(np.ma.masked_invalid(values), origin='lower', extent=extent,
+                              aspect='auto', cmap=cmap, vmin=0, vmax=vmax,
+                              interpolation='nearest')
+            self.figure.colorbar(image, ax=ax)
+            ax.set_xlabel('x₀')
+            ax.set_ylabel(second_label)
+            ax.set_title(f'{name}, μ={result.mu}, t={result.t_max:g}')
+
+        self.figure.tight_layout()
+        self.canvas.draw()
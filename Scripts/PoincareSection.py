@@ -0,0 +1,157 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.optimize import brentq
+from MethodsForSolving import ThreeBodySolver
+
+
+def _run_batch(section, init_states):
+    """Расчет сечения для группы начальных условий в процессе-исполнителе"""
+    return [section.compute_one(state) for state in init_states]
+
+
+class PoincareSection:
+    """Сечение Пуанкаре плоскостью state[axis] = value
+
+    Пересечения ищутся по ходу пошагового решения: на каждом шаге
+    проверяется смена знака state[axis] - value, и момент пересечения
+    уточняется методом Брента по плотному выводу этого шага. Точки t_eval
+    не нужны, в памяти хранятся только найденные пересечения.
+
+    По умолчанию - сечение y = 0 при v > 0.
+    """
+
+    # Номера переменных состояния
+    AXES = {'x': 0, 'y': 1, 'u': 2, 'v': 3}
+
+    def __init__(self, mu, axis='y', value=0.0, direction=1, method='DOP853',
+                 t_max=1000.0, max_crossings=None, escape_radius=10.0,
+                 rtol=ThreeBodySolver.RTOL, atol=ThreeBodySolver.ATOL):
+        """
+        Args:
+            mu: массовый параметр
+            axis: переменная, задающая плоскость сечения ('x', 'y', 'u', 'v')
+            value: значение переменной на плоскости
+            direction: 1 - пересечения с ростом переменной, -1 - с убыванием,
+                0 - любые
+            t_max: время интегрирования каждой траектории
+            max_crossings: предельное число пересечений на траекторию
+            escape_radius: расстояние от начала координат, при удалении на
+                которое решение прекращается
+        """
+        self.mu = float(mu)
+        self.axis = self.AXES[axis] if isinstance(axis, str) else int(axis)
+        self.value = float(value)
+        self.direction = int(np.sign(direction))
+        self.method = method
+        self.t_max = float(t_max)
+        self.max_crossings = max_crossings
+        self.escape_radius = float(escape_radius)
+        self.rtol = rtol
+        self.atol = atol
+
+    def iter_crossings(self, init_states):
+        """Генератор пересечений одной траектории: кортежи (t, state)
+
+        Решение прекращается по достижении t_max, max_crossings, ухода за
+        escape_radius или при отказе решателя (столкновение с телом).
+        """
+        stepper = ThreeBodySolver().make_stepper(init_states, self.method,
+                                                 (0.0, self.t_max), self.mu,
+                                                 self.rtol, self.atol)
+        axis, value = self.axis, self.value
+        g_old = stepper.y[axis] - value
+        count = 0
+
+        while stepper.status == 'running':
+            t_old = stepper.t
+            stepper.step()
+            if stepper.status == 'failed':
+                return
+
+            g_new = stepper.y[axis] - value
+            if (g_old < 0 <= g_new and self.direction >= 0) or \
+                    (g_old > 0 >= g_new and self.direction <= 0):
+                interpolant = stepper.dense_output()
+                t_cross = brentq(lambda t: interpolant(t)[axis] - value,
+                                 t_old, stepper.t, xtol=1e-14, rtol=4 * np.finfo(float).eps)
+                state = interpolant(t_cross)
+                state[axis] = value
+                yield t_cross, state
+
+                count += 1
+                if self.max_crossings is not None and count >= self.max_crossings:
+                    return
+            g_old = g_new
+
+            if stepper.y[0] ** 2 + stepper.y[1] ** 2 > self.escape_radius ** 2:
+                return
+
+    def compute_one(self, init_states):
+        """Все пересечения одной траектории
+
+        Returns:
+            (t, states) - массивы формы (n,) и (n, 4)
+        """
+        t, states = [], []
+        for t_cross, state in self.iter_crossings(init_states):
+            t.append(t_cross)
+            states.append(state)
+        return np.array(t), np.array(states).reshape(-1, 4)
+
+    def compute(self, init_states, workers=None, batch_size=4, progress=None):
+        """Сечение для набора начальных условий в пуле процессов
+
+        Args:
+            init_states: массив начальных условий формы (N, 4)
+            workers: число процессов; 1 - расчет в текущем процессе
+            batch_size: число траекторий в одном задании пула
+            progress: функция progress(done, total), вызываемая по мере
+                готовности траекторий
+
+        Returns:
+            список пар (t, states) в порядке начальных условий
+        """
+        init_states = np.atleast_2d(np.asarray(init_states, dtype=float))
+        total = len(init_states)
+        workers = workers or os.cpu_count()
+        batches = [init_states[i:i + batch_size] for i in range(0, total, batch_size)]
+
+        results = []
+        if workers == 1 or len(batches) == 1:
+            for batch in batches:
+                results.extend(_run_batch(self, batch))
+                if progress is not None:
+                    progress(len(results), total)
+            return results
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            try:
+                # map сохраняет порядок заданий; результаты выдаются по мере готовности
+                for batch_result in pool.map(_run_batch, [self] * len(batches), batches):
+                    results.extend(batch_result)
+                    if progress is not None:
+                        progress(len(results), total)
+            except BaseException:
+                # Прерывание (в том числе из progress): ожидающие задания снимаются
+                pool.shutdown(cancel_futures=True)
+                raise
+        return results
+
+    @staticmethod
+    def states_on_energy(x_values, C, mu, y0=0.0, u0=0.0):
+        """Начальные условия (x, y0, u0, v > 0) с постоянной Якоби C
+
+        Значения x, для которых точка лежит в запрещенной области
+        (2Ω - C - u0² < 0), пропускаются.
+
+        Returns:
+            массив формы (n, 4)
+        """
+        x = np.atleast_1d(np.asarray(x_values, dtype=float))
+        v_sq = 2 * ThreeBodySolver.effective_potential(x, y0, mu) - C - u0 * u0
+        allowed = np.isfinite(v_sq) & (v_sq >= 0)
+        x = x[allowed]
+        return np.column_stack([x, np.full(x.size, float(y0)),
+                                np.full(x.size, float(u0)), np.sqrt(v_sq[allowed])])
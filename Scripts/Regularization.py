@@ -0,0 +1,227 @@
+import numpy as np
+from scipy.integrate import solve_ivp
+from scipy.optimize import OptimizeResult
+from MethodsForSolving import ThreeBodySolver
+
+
+# Границы областей регуляризации около тел (с гистерезисом)
+ENTER_RADIUS = 0.05
+EXIT_RADIUS = 0.1
+
+
+def primaries(mu):
+    """Положения и массы тел: [(x_M1, m1), (x_M2, m2)]"""
+    return [(-mu, 1 - mu), (1 - mu, mu)]
+
+
+def to_regularized(state, t, mu, body):
+    """Переход к переменным Леви-Чивиты около тела body (0 - M1, 1 - M2)
+
+    Координата относительно тела q = w², физическое время t входит
+    в состояние как пятая переменная, dt/ds = |w|².
+
+    Returns:
+        (состояние [w1, w2, w1', w2', t], постоянная Якоби C)
+    """
+    x, y, u, v = state
+    xp, _ = primaries(mu)[body]
+    C = 2 * ThreeBodySolver.effective_potential(x, y, mu) - (u * u + v * v)
+
+    w = np.sqrt(complex(x - xp, y))
+    dw = complex(u, v) * np.conj(w) / 2
+    return np.array([w.real, w.imag, dw.real, dw.imag, t]), C
+
+
+def from_regularized(reg_states, mu, body):
+    """Обратный переход: состояния (5, n) -> (t, [x, y, u, v])"""
+    w1, w2, dw1, dw2, t = reg_states
+    xp, _ = primaries(mu)[body]
+    w = w1 + 1j * w2
+    dw = dw1 + 1j * dw2
+    rho = w1 * w1 + w2 * w2
+
+    q = w * w
+    with np.errstate(divide='ignore', invalid='ignore'):
+        q_dot = 2 * dw * w / rho
+    return t, np.array([q.real + xp, q.imag, q_dot.real, q_dot.imag])
+
+
+def regularized_equations(s, reg_state, mu, body, C):
+    """Уравнения движения в переменных Леви-Чивиты
+
+    w'' = -2i|w|²w' + |w|² w̄ (Ωx + iΩy)/2 + w(2Ω - C)/4,
+    где Ω - потенциал без слагаемого притяжения тела body; особенность
+    1/r этого тела сокращается точно, и правая часть регулярна при w = 0.
+    """
+    w1, w2, dw1, dw2, _ = reg_state
+    xp, _ = primaries(mu)[body]
+    xo, mo = primaries(mu)[1 - body]
+
+    rho = w1 * w1 + w2 * w2
+    x = w1 * w1 - w2 * w2 + xp
+    y = 2 * w1 * w2
+
+    # Потенциал и его градиент без особого слагаемого
+    dxo = x - xo
+    ro_sq = dxo * dxo + y * y
+    ro = np.sqrt(ro_sq)
+    ko = mo / (ro_sq * ro)
+    omega = (x * x + y * y) / 2 + mo / ro
+    gx = x - ko * dxo
+    gy = y - ko * y
+
+    energy = (2 * omega - C) / 4
+    return [
+        dw1,
+        dw2,
+        2 * rho * dw2 + rho / 2 * (w1 * gx + w2 * gy) + w1 * energy,
+        -2 * rho * dw1 + rho / 2 * (w1 * gy - w2 * gx) + w2 * energy,
+        rho
+    ]
+
+
+def solve_regularized(solver, init_states, method, t_span, t_eval, mu,
+                      rtol, atol, enter_radius=ENTER_RADIUS, exit_radius=EXIT_RADIUS):
+    """Решение с регуляризацией Леви-Чивиты при сближениях с телами
+
+    Интегрирование идет в физических переменных, пока траектория не
+    подойдет к одному из тел ближе enter_radius (событие solve_ivp), затем
+    в регуляризованных переменных около этого тела до удаления на
+    exit_radius, и так далее. Точки t_eval из регуляризованных участков
+    находятся обращением t(s) методом Ньютона по плотному выводу.
+
+    Returns:
+        результат в формате solve_ivp; в segments перечислены участки
+        (тело или None, t_начала, t_конца, число вычислений правой части)
+    """
+    t_end = float(t_span[1])
+    t_eval = np.asarray(t_eval, dtype=float)
+    t = float(t_span[0])
+    state = np.asarray(init_states, dtype=float)
+    body = _closest_body(state, mu, enter_radius)
+
+    t_out, y_out, segments = [], [], []
+    last_t = -np.inf  # последняя выданная точка t_eval
+    nfev = 0
+
+    while t < t_end:
+        window = t_eval[(t_eval >= t) & (t_eval <= t_end) & (t_eval > last_t)]
+
+        if body is None:
+            events = [_enter_event(mu, k, enter_radius) for k in (0, 1)]
+            sol = solve_ivp(solver.equations, (t, t_end), state, method=method,
+                            t_eval=window, args=(mu,), rtol=rtol, atol=atol,
+                            events=events)
+            nfev += sol.nfev
+            if sol.status == -1:
+                return _result(t_out, y_out, segments, nfev, False, sol.message)
+
+            t_start = t
+            if sol.status == 1:
+                body = 0 if sol.t_events[0].size else 1
+                t = float(sol.t_events[body][0])
+                state = sol.y_events[body][0]
+            else:
+                t = t_end
+            segments.append((None, t_start, t, sol.nfev))
+        else:
+            reg_state, C = to_regularized(state, t, mu, body)
+            s_max = 10 * (t_end - t) / exit_radius ** 2 + 1.0
+            sol = solve_ivp(regularized_equations, (0, s_max), reg_state,
+                            method=method, args=(mu, body, C), rtol=rtol, atol=atol,
+                            events=[_exit_event(exit_radius), _time_event(t_end)],
+                            dense_output=True)
+            nfev += sol.nfev
+            if sol.status == -1:
+                return _result(t_out, y_out, segments, nfev, False, sol.message)
+
+            if sol.status == 1:
+                k = 0 if sol.t_events[0].size else 1
+                s_stop = float(sol.t_events[k][0])
+                reg_stop = sol.y_events[k][0]
+            else:
+                s_stop = float(sol.t[-1])
+                reg_stop = sol.y[:, -1]
+            t_start = t
+            t = min(float(reg_stop[4]), t_end)
+
+            # Точки t_eval этого участка в физическом времени
+            window = window[window <= t]
+            if window.size:
+                _, states = from_regularized(sol.sol(_invert_time(sol, window, s_stop)),
+                                             mu, body)
+                sol.t, sol.y = window, states
+            else:
+                sol.t, sol.y = window, np.empty((4, 0))
+            segments.append((body, t_start, t, sol.nfev))
+
+            _, state = from_regularized(reg_stop[:, None], mu, body)
+            state = state[:, 0]
+            if sol.status == 1 and k == 0:
+                body = None
+
+        if sol.t.size:
+            t_out.append(sol.t)
+            y_out.append(sol.y)
+            last_t = sol.t[-1]
+
+    return _result(t_out, y_out, segments, nfev, True,
+                   "Интегрирование успешно завершено")
+
+
+def _closest_body(state, mu, radius):
+    """Номер тела, к которому точка ближе radius, или None"""
+    x, y = state[0], state[1]
+    for k, (xp, _) in enumerate(primaries(mu)):
+        if np.hypot(x - xp, y) < radius:
+            return k
+    return None
+
+
+def _enter_event(mu, body, radius):
+    xp, _ = primaries(mu)[body]
+
+    def event(t, state, mu_arg):
+        return np.hypot(state[0] - xp, state[1]) - radius
+    event.terminal = True
+    event.direction = -1
+    return event
+
+
+def _exit_event(radius):
+    def event(s, reg_state, mu, body, C):
+        return reg_state[0] ** 2 + reg_state[1] ** 2 - radius
+    event.terminal = True
+    event.direction = 1
+    return event
+
+
+def _time_event(t_end):
+    def event(s, reg_state, mu, body, C):
+        return reg_state[4] - t_end
+    event.terminal = True
+    event.direction = 1
+    return event
+
+
+def _invert_time(sol, t_targets, s_stop):
+    """Значения s, для которых t(s) = t_targets (t(s) монотонно возрастает)"""
+    s_nodes = sol.t[sol.t <= s_stop]
+    t_nodes = sol.y[4, :s_nodes.size]
+    s = np.interp(t_targets, t_nodes, s_nodes)
+    for _ in range(8):
+        reg = sol.sol(s)
+        rho = np.maximum(reg[0] ** 2 + reg[1] ** 2, np.finfo(float).tiny)
+        step = (reg[4] - t_targets) / rho
+        s = np.clip(s - step, 0.0, s_stop)
+        if np.all(np.abs(step) <= 1e-14 * np.maximum(1.0, np.abs(s))):
+            break
+    return s
+
+
+def _result(t_out, y_out, segments, nfev, success, message):
+    t = np.concatenate(t_out) if t_out else np.empty(0)
+    y = np.concatenate(y_out, axis=1) if y_out else np.empty((4, 0))
+    return OptimizeResult(t=t, y=y, success=success, status=0 if success else -1,
+                          message=message, nfev=nfev, njev=0, nlu=0,
+                          segments=segments)
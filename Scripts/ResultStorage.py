@@ -0,0 +1,38 @@
+import json
+import os
+
+import numpy as np
+
+
+def save_npz(path, **arrays):
+    """Запись массивов в файл .npz через временный файл
+
+    Файл появляется под своим именем только целиком, поэтому прерванный
+    расчет не оставляет поврежденный фрагмент, который будет принят за готовый.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def prepare_output_dir(output_dir, manifest_name, manifest):
+    """Создание каталога результатов и проверка описания расчета
+
+    При первом запуске описание manifest (словарь, сериализуемый в JSON)
+    записывается в файл manifest_name; при продолжении расчета в том же
+    каталоге оно должно совпадать с сохраненным.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, manifest_name)
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            if json.load(f) != manifest:
+                raise ValueError(
+                    f"Каталог {output_dir} содержит результаты расчета "
+                    f"с другими параметрами"
+                )
+    else:
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
@@ -0,0 +1,205 @@
+import time
+
+import numpy as np
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+from scipy.optimize import OptimizeResult
+from Instrumentation import RunReport
+from MethodsForSolving import ThreeBodySolver
+
+
+class SolverWorker(QObject):
+    """Решение системы в отдельном потоке с передачей промежуточных результатов
+
+    Сигналы несут номер запуска run_id, чтобы главное окно могло
+    игнорировать результаты устаревших запусков. Ход решения записывается
+    в отчет report, который передается с решением (sol.report) и
+    дополняется при отрисовке.
+
+    При заданном preview сначала выполняется быстрое грубое решение (малые
+    допуски и мало точек), которое выдается сигналом preview_ready, а затем
+    основное решение с полными настройками. При regularize основное
+    решение строится целиком через solve_system(regularize=True): его
+    фрагменты не передаются, а отмена проверяется только по окончании.
+    """
+
+    progress = pyqtSignal(int, float)  # run_id, достигнутая доля t_max
+    chunk_ready = pyqtSignal(int, object, object)  # run_id, t, y
+    preview_ready = pyqtSignal(int, object)  # run_id, предварительное решение
+    finished = pyqtSignal(int, object)  # run_id, решение
+    failed = pyqtSignal(int, str)  # run_id, текст ошибки
+    cancelled = pyqtSignal(int)
+
+    # Минимальный интервал между отправками фрагментов в окно графика, с
+    EMIT_INTERVAL = 0.1
+
+    def __init__(self, run_id, init_states, method, t_span, t_eval, mu,
+                 preview=None, stream=True, regularize=False):
+        """
+        Args:
+            preview: (rtol, atol, число точек) предварительного решения
+            stream: передавать ли фрагменты основного решения (chunk_ready)
+            regularize: интегрировать сближения с телами в переменных
+                Леви-Чивиты
+        """
+        super().__init__()
+        self.run_id = run_id
+        self.init_states = init_states
+        self.method = method
+        self.t_span = t_span
+        self.t_eval = t_eval
+        self.mu = mu
+        self.preview = preview
+        self.stream = stream
+        self.regularize = regularize
+        self._cancelled = False
+        self.report = RunReport(mu=mu, method=method, init_states=list(init_states),
+                                t_span=list(t_span), points=len(t_eval),
+                                regularize=regularize)
+
+    def cancel(self):
+        """Запрос на прерывание (проверяется между фрагментами решения)"""
+        self._cancelled = True
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            if self.preview is not None:
+                preview = self._solve_preview()
+                if preview is None:
+                    self.cancelled.emit(self.run_id)
+                    return
+                self.preview_ready.emit(self.run_id, preview)
+
+            with self.report.phase('integration'):
+                sol = self._solve()
+        except Exception as e:
+            self.failed.emit(self.run_id, str(e))
+            return
+
+        if sol is None:
+            self.cancelled.emit(self.run_id)
+        else:
+            self.finished.emit(self.run_id, sol)
+
+    def _solve(self):
+        solver = ThreeBodySolver()
+        if self.regularize:
+            sol = solver.solve_system(self.init_states, self.method, self.t_span, self.t_eval,
+                                      self.mu, regularize=True, report=self.report)
+            if self._cancelled:
+                return None
+            if not sol.success:
+                raise RuntimeError(sol.message)
+            sol.report = self.report
+            self.progress.emit(self.run_id, 1.0)
+            return sol
+
+        t0, t_max = self.t_span
+        chunk_size = max(1000, len(self.t_eval) // 50)
+
+        all_t, all_y = [], []
+        unsent_t, unsent_y = [], []
+        last_emit = time.monotonic()
+
+        for t_now, t_chunk, y_chunk in solver.iter_solution(
+                self.init_states, self.method, self.t_span, self.t_eval,
+                self.mu, chunk_size=chunk_size, report=self.report):
+            if self._cancelled:
+                return None
+
+            if t_chunk.size:
+                all_t.append(t_chunk)
+                all_y.append(y_chunk)
+                unsent_t.append(t_chunk)
+                unsent_y.append(y_chunk)
+
+            now = time.monotonic()
+            if now - last_emit >= self.EMIT_INTERVAL:
+                self.progress.emit(self.run_id, (t_now - t0) / (t_max - t0))
+                if unsent_t and self.stream:
+                    self.chunk_ready.emit(self.run_id, np.concatenate(unsent_t),
+                                          np.concatenate(unsent_y, axis=1))
+                    unsent_t, unsent_y = [], []
+                last_emit = now
+
+        self.progress.emit(self.run_id, 1.0)
+        return OptimizeResult(
+            t=np.concatenate(all_t) if all_t else np.empty(0),
+            y=np.concatenate(all_y, axis=1) if all_y else np.empty((4, 0)),
+            success=True,
+            status=0,
+            message="Интегрирование успешно завершено",
+            nfev=self.report.counters['nfev'],
+            njev=self.report.counters['njev'],
+            nlu=self.report.counters['nlu'],
+            report=self.report
+        )
+
+    def _solve_preview(self):
+        """Грубое решение для предварительного показа (None при отмене)"""
+        rtol, atol, n_points = self.preview
+        t_eval = np.linspace(*self.t_span, n_points)
+
+        all_t, all_y = [], []
+        for _, t_chunk, y_chunk in ThreeBodySolver().iter_solution(
+                self.init_states, self.method, self.t_span, t_eval, self.mu,
+                rtol=rtol, atol=atol):
+            if self._cancelled:
+                return None
+            all_t.append(t_chunk)
+            all_y.append(y_chunk)
+
+        return OptimizeResult(
+            t=np.concatenate(all_t),
+            y=np.concatenate(all_y, axis=1),
+            success=True,
+            status=0,
+            message="Предварительное решение"
+        )
+
+
+class TaskCancelled(Exception):
+    """Задача прервана по запросу (см. TaskWorker.cancel)"""
+
+
+class TaskWorker(QObject):
+    """Выполнение долгой задачи в отдельном потоке
+
+    Задача task(*args, progress=...) сама распределяет работу по пулу
+    процессов (сечения Пуанкаре, карты хаоса); поток только ожидает
+    результат, чтобы не блокировать главное окно. После отмены очередной
+    вызов progress прерывает задачу исключением TaskCancelled.
+    """
+
+    progress = pyqtSignal(int, float)  # run_id, доля выполненной работы
+    finished = pyqtSignal(int, object)  # run_id, результат задачи
+    failed = pyqtSignal(int, str)  # run_id, текст ошибки
+    cancelled = pyqtSignal(int)  # run_id
+
+    def __init__(self, run_id, task, *args):
+        super().__init__()
+        self.run_id = run_id
+        self.task = task
+        self.args = args
+        self._cancelled = False
+
+    def cancel(self):
+        """Запрос остановки; вызывается из главного потока"""
+        self._cancelled = True
+
+    def _report_progress(self, done, total):
+        if self._cancelled:
+            raise TaskCancelled()
+        self.progress.emit(self.run_id, done / total)
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            result = self.task(*self.args, progress=self._report_progress)
+        except TaskCancelled:
+            self.cancelled.emit(self.run_id)
+            return
+        except Exception as e:
+            self.failed.emit(self.run_id, str(e))
+            return
+        self.finished.emit(self.run_id, result)
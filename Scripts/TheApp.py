@@ -1,21 +1,78 @@
+import os
 import sys
 import numpy as np
 import PyQt5 as Qt
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QGroupBox, QLabel, QLineEdit,
                              QComboBox, QPushButton, QGridLayout, QDoubleSpinBox,
-                             QTextEdit, QFormLayout, QMessageBox)
+                             QTextEdit, QFormLayout, QMessageBox, QProgressBar,
+                             QFileDialog, QCheckBox)
+from PyQt5.QtCore import QThread, QTimer
 from MethodsForSolving import ThreeBodySolver
-from PlotWindow import OrbitPlotWindow
+from ChaosMap import ChaosMap
+from Instrumentation import ProfileHook, RunReport, add_hook, append_log
+from PlotWindow import ChaosMapWindow, OrbitPlotWindow, PoincarePlotWindow
+from PoincareSection import PoincareSection
+from SolverWorker import SolverWorker, TaskWorker
+from TrajectoryCache import TrajectoryCache
+from TrajectoryStorage import StoredTrajectory
 
 
 class MainWindow(QMainWindow):
     """Главное окно приложения"""
 
+    # Сечение Пуанкаре: число дополнительных траекторий с той же постоянной
+    # Якоби и полуширина интервала их начальных x около x₀
+    SECTION_ORBITS = 24
+    SECTION_HALF_WIDTH = 0.3
+
+    # Карта хаоса: число узлов по каждой оси и полуширина области около (x₀, v₀)
+    CHAOS_MAP_SIZE = 100
+    CHAOS_MAP_HALF_WIDTH = 0.2
+    # Небольшие фрагменты, чтобы отмена снимала большую часть работы
+    CHAOS_MAP_CHUNK = 256
+
+    # Пересчет при изменении параметров: задержка после последнего изменения
+    # (мс) и настройки быстрого предварительного решения
+    LIVE_DELAY = 150
+    PREVIEW_RTOL = 1e-5
+    PREVIEW_ATOL = 1e-7
+    PREVIEW_POINTS = 2000
+
     def __init__(self):
         super().__init__()
         self.solver = ThreeBodySolver()
         self.plot_window = None
+        self.section_window = None
+        self.chaos_window = None
+
+        # Кэш решений для повторных запусков с теми же параметрами
+        self.cache = TrajectoryCache(self.solver, cache_dir=os.path.join(
+            os.path.expanduser('~'), '.cache', 'RestrictedThreeBodyProblemApp', 'trajectories'))
+
+        # Журнал отчетов о решениях (по строке JSON на запуск)
+        self.report_log = os.path.join(os.path.expanduser('~'), '.cache',
+                                       'RestrictedThreeBodyProblemApp', 'runs.jsonl')
+
+        # Фоновое решение: номер текущего запуска, его рабочий объект и
+        # параметры построения; завершающиеся потоки хранятся до остановки
+        self.run_id = 0
+        self.active_worker = None
+        self.active_run = None
+        self.active_prefix = None
+        self.active_live = False
+        self.active_regularize = False
+        self.solver_threads = []
+        self.section_run_id = 0
+        self.chaos_run_id = 0
+
+        # Отложенный пересчет: таймер перезапускается при каждом изменении,
+        # поэтому решение начинается только после паузы во вводе
+        self.live_timer = QTimer(self)
+        self.live_timer.setSingleShot(True)
+        self.live_timer.setInterval(self.LIVE_DELAY)
+        self.live_timer.timeout.connect(self.solve_live)
+
         self.init_ui()
 
     def init_ui(self):
@@ -88,7 +145,7 @@ class MainWindow(QMainWindow):
 
         params_layout.addWidget(QLabel("Метод решения:"), 1, 0)
         self.method_combo = QComboBox()
-        self.method_combo.addItems(['RK45', 'DOP853', 'LSODA'])
+        self.method_combo.addItems(ThreeBodySolver.METHODS)
         params_layout.addWidget(self.method_combo, 1, 1)
 
         params_layout.addWidget(QLabel("Время моделирования:"), 2, 0)
@@ -144,6 +201,49 @@ class MainWindow(QMainWindow):
         self.solve_button.clicked.connect(self.solve_problem)
         layout.addWidget(self.solve_button)
 
+        self.live_checkbox = QCheckBox("Пересчитывать при изменении параметров")
+        self.live_checkbox.setToolTip("Сначала показывается быстрое грубое решение, "
+                                      "затем оно уточняется в фоне")
+        layout.addWidget(self.live_checkbox)
+
+        self.regularize_checkbox = QCheckBox("Регуляризация сближений с телами")
+        self.regularize_checkbox.setToolTip("Сближения интегрируются в переменных Леви-Чивиты; "
+                                            "траектория строится после окончания решения")
+        self.regularize_checkbox.toggled.connect(self.schedule_live_update)
+        layout.addWidget(self.regularize_checkbox)
+
+        self.extend_checkbox = QCheckBox("Продолжать более короткие решения из кэша")
+        self.extend_checkbox.setToolTip("Решается только недостающая часть интервала; результат "
+                                        "отличается от нового решения в пределах допусков")
+        layout.addWidget(self.extend_checkbox)
+        for spin_box in (self.x0_input, self.y0_input, self.u0_input, self.v0_input,
+                         self.mu_input, self.time_input, self.points_input):
+            spin_box.valueChanged.connect(self.schedule_live_update)
+        self.method_combo.currentIndexChanged.connect(self.schedule_live_update)
+
+        # Ход фонового решения
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 1000)
+        self.progress_bar.setTextVisible(False)
+        layout.addWidget(self.progress_bar)
+
+        self.cancel_button = QPushButton("Отменить решение")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_solving)
+        layout.addWidget(self.cancel_button)
+
+        self.open_button = QPushButton("Открыть сохраненную траекторию")
+        self.open_button.clicked.connect(self.open_trajectory)
+        layout.addWidget(self.open_button)
+
+        self.section_button = QPushButton("Построить сечение Пуанкаре (y = 0, v > 0)")
+        self.section_button.clicked.connect(self.solve_section)
+        layout.addWidget(self.section_button)
+
+        self.chaos_button = QPushButton("Построить карту хаоса (FLI, MEGNO)")
+        self.chaos_button.clicked.connect(self.solve_chaos_map)
+        layout.addWidget(self.chaos_button)
+
         panel.setLayout(layout)
         return panel
 
@@ -204,6 +304,16 @@ class MainWindow(QMainWindow):
         presets_group.setLayout(presets_layout)
         layout.addWidget(presets_group)
 
+        # Отчет о последнем решении
+        report_group = QGroupBox("Отчет о решении")
+        report_layout = QVBoxLayout()
+        self.report_text = QTextEdit()
+        self.report_text.setReadOnly(True)
+        self.report_text.setPlaceholderText("Время по фазам и статистика шагов появятся после решения")
+        report_layout.addWidget(self.report_text)
+        report_group.setLayout(report_layout)
+        layout.addWidget(report_group)
+
         panel.setLayout(layout)
         return panel
 
@@ -250,15 +360,36 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "Ошибка", "Пожалуйста, введите корректные числовые значения")
 
     def update_plot_parameters(self, center_x, center_y, bounds_x, bounds_y):
+        """Обновляет параметры графика
+
+        Последнее решение хранится в окне графика, поэтому изменение области
+        отображения только перерисовывает траекторию без повторного решения.
         """
-        Обновляет параметры графика
-        Эту функцию нужно интегрировать с вашим существующим кодом
-        """
-        print(f"Новые параметры графика: Центр({center_x}, {center_y}), Размер({bounds_x}, {bounds_y})")
-        # Здесь вызывайте ваш метод plot_orbit с новыми параметрами:
-        #self.plot_orbit(sol, mu, init_states, method,
-        #                center_point=(center_x, center_y),
-        #                bounds=(bounds_x, bounds_y))
+        if self.plot_window is not None:
+            self.plot_window.set_view((center_x, center_y), (bounds_x, bounds_y))
+
+    def open_trajectory(self):
+        """Отображение траектории из файла без загрузки ее в память"""
+        path, _ = QFileDialog.getOpenFileName(self, "Открыть траекторию", "",
+                                              "Траектории (*.traj)")
+        if not path:
+            return
+        try:
+            trajectory = StoredTrajectory(path)
+            center_x = float(self.center_x_input.text() or 0.0)
+            center_y = float(self.center_y_input.text() or 0.0)
+            bounds_x = float(self.bounds_x_input.text() or 5.0)
+            bounds_y = float(self.bounds_y_input.text() or 5.0)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Ошибка", f"Не удалось открыть траекторию: {e}")
+            return
+
+        if self.plot_window is None:
+            self.plot_window = OrbitPlotWindow()
+        self.plot_window.plot_orbit(trajectory, trajectory.mu, trajectory.init_states,
+                                    trajectory.method, (center_x, center_y),
+                                    (bounds_x, bounds_y))
+        self.plot_window.show()
 
     def solve_problem(self):
         """Решение задачи и построение графика"""
@@ -275,11 +406,10 @@ class MainWindow(QMainWindow):
             n_points = int(self.points_input.value())
             mu = self.mu_input.value()
 
+            # Сетка с постоянным шагом: решение для большего t_max
+            # продолжает сохраненное в кэше (см. TrajectoryCache.fixed_step_grid)
             t_span = (0, t_max)
-            t_eval = np.linspace(0, t_max, n_points)
-
-            # Решение системы
-            sol = self.solver.solve_system(init_states, method, t_span, t_eval, mu)
+            t_eval = TrajectoryCache.fixed_step_grid(t_span, n_points)
 
             # Получение параметров графика с обработкой ошибок
             try:
@@ -314,12 +444,9 @@ class MainWindow(QMainWindow):
             if self.plot_window is None:
                 self.plot_window = OrbitPlotWindow()
 
-            self.plot_window.plot_orbit(
-                sol, mu, init_states, method,
-                (center_x, center_y),
-                (bounds_x, bounds_y)
-            )
-            self.plot_window.show()
+            # Решение системы в фоновом потоке
+            self.start_solving(init_states, method, t_span, t_eval, mu,
+                               (center_x, center_y), (bounds_x, bounds_y))
 
             # Обновление отображаемых условий
             self.update_equations_display()
@@ -329,8 +456,317 @@ class MainWindow(QMainWindow):
             print(error_msg)
             QMessageBox.critical(self, "Ошибка вычислений", error_msg)
 
+    def schedule_live_update(self):
+        """Отложенный пересчет после изменения параметров"""
+        if self.live_checkbox.isChecked():
+            self.live_timer.start()
+
+    def solve_live(self):
+        """Пересчет без диалогов: грубое решение сразу, затем уточнение в фоне"""
+        init_states = [self.x0_input.value(), self.y0_input.value(),
+                       self.u0_input.value(), self.v0_input.value()]
+        t_max = self.time_input.value()
+        try:
+            center_point = (float(self.center_x_input.text() or 0.0),
+                            float(self.center_y_input.text() or 0.0))
+            bounds = (float(self.bounds_x_input.text() or 5.0),
+                      float(self.bounds_y_input.text() or 5.0))
+        except ValueError:
+            self.statusBar().showMessage("Некорректные параметры области графика")
+            return
+        if bounds[0] <= 0 or bounds[1] <= 0:
+            self.statusBar().showMessage("Размеры области графика должны быть положительными")
+            return
+
+        if self.plot_window is None:
+            self.plot_window = OrbitPlotWindow()
+        self.start_solving(init_states, self.method_combo.currentText(), (0, t_max),
+                           TrajectoryCache.fixed_step_grid((0, t_max),
+                                                           self.points_input.value()),
+                           self.mu_input.value(), center_point, bounds, live=True)
+        self.update_equations_display()
+
+    def start_solving(self, init_states, method, t_span, t_eval, mu, center_point, bounds,
+                      live=False):
+        """Запуск решения в отдельном потоке; предыдущий запуск прерывается
+
+        При live=True вместо постепенного вывода траектории сначала
+        показывается предварительное решение, а ошибки выводятся в строку
+        состояния, а не в диалог. Если включено продолжение решений и в кэше
+        есть то же решение на более коротком интервале, решается только
+        недостающая часть. Регуляризованные решения в кэше не хранятся.
+        """
+        self.cancel_solving()
+        regularize = self.regularize_checkbox.isChecked()
+
+        sol = None if regularize else self.cache.get(init_states, method, t_span, t_eval, mu)
+        if sol is not None:
+            report = RunReport(mu=mu, method=method, init_states=list(init_states),
+                               t_span=list(t_span), points=len(t_eval), cached=True)
+            draw = self.plot_window.update_orbit if live else self.plot_window.plot_orbit
+            draw(sol, mu, init_states, method, center_point, bounds, report)
+            self.show_report(report)
+            self.plot_window.show()
+            self.progress_bar.setValue(self.progress_bar.maximum())
+            return
+
+        prefix = None
+        if self.extend_checkbox.isChecked() and not regularize:
+            prefix = self.cache.find_prefix(init_states, method, t_span, t_eval, mu)
+        if prefix is None:
+            solve_args = (init_states, method, t_span, t_eval, mu)
+        else:
+            solve_args = (prefix.y_end, method, (prefix.t_end, t_span[1]),
+                          t_eval[prefix.n_prefix:], mu)
+
+        self.run_id += 1
+        preview = (self.PREVIEW_RTOL, self.PREVIEW_ATOL, self.PREVIEW_POINTS) if live else None
+        worker = SolverWorker(self.run_id, *solve_args, preview=preview, stream=not live,
+                              regularize=regularize)
+        thread = QThread(self)
+        worker.moveToThread(thread)
+
+        thread.started.connect(worker.run)
+        worker.progress.connect(self.on_solver_progress)
+        worker.chunk_ready.connect(self.on_solver_chunk)
+        worker.preview_ready.connect(self.on_solver_preview)
+        worker.finished.connect(self.on_solver_finished)
+        worker.failed.connect(self.on_solver_failed)
+        for signal in (worker.finished, worker.failed, worker.cancelled):
+            signal.connect(thread.quit)
+        thread.finished.connect(lambda: self.forget_solver_thread(thread))
+
+        self.active_worker = worker
+        self.active_run = (mu, init_states, method, t_span, t_eval, center_point, bounds)
+        self.active_prefix = prefix
+        self.active_live = live
+        self.active_regularize = regularize
+        self.solver_threads.append((worker, thread))
+
+        if not live:
+            self.plot_window.start_stream(mu, init_states, method, center_point, bounds)
+            if prefix is not None:
+                self.plot_window.append_stream(prefix.t, prefix.y)
+            self.plot_window.show()
+
+        self.progress_bar.setValue(0)
+        self.cancel_button.setEnabled(True)
+        thread.start()
+
+    def cancel_solving(self):
+        """Прерывание текущего решения; его результаты больше не принимаются"""
+        if self.active_worker is not None:
+            self.active_worker.cancel()
+            self.active_worker = None
+            self.run_id += 1
+        self.cancel_button.setEnabled(False)
+        self.progress_bar.setValue(0)
+        self.statusBar().clearMessage()
+
+    def forget_solver_thread(self, thread):
+        """Освобождение завершившегося потока решения"""
+        self.solver_threads = [(w, t) for w, t in self.solver_threads if t is not thread]
+
+    def on_solver_progress(self, run_id, fraction):
+        if run_id == self.run_id:
+            self.progress_bar.setValue(int(fraction * self.progress_bar.maximum()))
+
+    def on_solver_chunk(self, run_id, t_chunk, y_chunk):
+        if run_id == self.run_id:
+            self.plot_window.append_stream(t_chunk, y_chunk)
+
+    def on_solver_preview(self, run_id, sol):
+        if run_id != self.run_id:
+            return
+        mu, init_states, method, _, _, center_point, bounds = self.active_run
+        if self.active_prefix is not None:
+            sol = self.cache.splice(self.active_prefix, sol)
+        self.plot_window.update_orbit(sol, mu, init_states, method, center_point, bounds)
+        self.plot_window.show()
+        self.statusBar().showMessage("Предварительное решение; идет уточнение...")
+
+    def on_solver_finished(self, run_id, sol):
+        if run_id != self.run_id:
+            return
+        self.active_worker = None
+        self.cancel_button.setEnabled(False)
+
+        mu, init_states, method, t_span, t_eval, center_point, bounds = self.active_run
+        if self.active_prefix is not None:
+            sol = self.cache.splice(self.active_prefix, sol)
+            # Отчет описывает весь запуск, а не решенную часть
+            sol.report.context.update(init_states=list(init_states), t_span=list(t_span),
+                                      points=len(t_eval),
+                                      extended_from=self.active_prefix.t_end)
+        if not self.active_regularize:
+            self.cache.put(sol, init_states, method, t_span, t_eval, mu)
+        # После предварительного решения график не строится заново
+        draw = self.plot_window.update_orbit if self.active_live else self.plot_window.plot_orbit
+        draw(sol, mu, init_states, method, center_point, bounds, sol.report)
+        self.plot_window.show()
+        self.show_report(sol.report)
+        self.statusBar().clearMessage()
+
+    def show_report(self, report):
+        """Вывод отчета о решении в панель и запись в журнал"""
+        report.finish()
+        html = report.summary_html()
+        if report.context.get('cached'):
+            html = "<p>Решение взято из кэша.</p>" + html
+        elif 'extended_from' in report.context:
+            html = (f"<p>Решение продолжено из кэша с t = "
+                    f"{report.context['extended_from']:g}.</p>") + html
+        html = f"<p>Точек решения: {report.context['points']}</p>" + html
+        self.report_text.setHtml(html)
+        try:
+            append_log(self.report_log, report)
+        except OSError as e:
+            print(f"Не удалось записать отчет в журнал: {e}")
+
+    def on_solver_failed(self, run_id, message):
+        if run_id != self.run_id:
+            return
+        self.active_worker = None
+        self.cancel_button.setEnabled(False)
+
+        error_msg = f"Ошибка при решении системы: {message}"
+        print(error_msg)
+        if self.active_live:
+            self.statusBar().showMessage(error_msg)
+        else:
+            QMessageBox.critical(self, "Ошибка вычислений", error_msg)
+
+    def solve_section(self):
+        """Расчет сечения Пуанкаре для текущих начальных условий
+
+        Вместе с текущей траекторией считаются SECTION_ORBITS траекторий с
+        той же постоянной Якоби, начинающихся на оси y = 0 около x₀.
+        """
+        init_states = np.array([
+            self.x0_input.value(),
+            self.y0_input.value(),
+            self.u0_input.value(),
+            self.v0_input.value()
+        ])
+        mu = self.mu_input.value()
+        method = self.method_combo.currentText()
+        x0, y0, u0, v0 = init_states
+        C = 2 * ThreeBodySolver.effective_potential(x0, y0, mu) - u0 * u0 - v0 * v0
+
+        x_values = np.linspace(x0 - self.SECTION_HALF_WIDTH, x0 + self.SECTION_HALF_WIDTH,
+                               self.SECTION_ORBITS)
+        init_states = np.vstack([init_states,
+                                 PoincareSection.states_on_energy(x_values, C, mu)])
+        section = PoincareSection(mu, method=method, t_max=self.time_input.value())
+
+        self.section_run_id += 1
+        self.start_task(self.section_run_id, section.compute, (init_states,),
+                        lambda run_id, results:
+                        self.on_section_finished(run_id, results, mu, C, method),
+                        self.on_section_failed)
+        self.section_button.setEnabled(False)
+
+    def on_section_finished(self, run_id, results, mu, C, method):
+        if run_id != self.section_run_id:
+            return
+        self.section_button.setEnabled(True)
+        if self.section_window is None:
+            self.section_window = PoincarePlotWindow()
+        self.section_window.plot_section(results, mu, C, method)
+        self.section_window.show()
+
+    def on_section_failed(self, run_id, message):
+        if run_id != self.section_run_id:
+            return
+        self.section_button.setEnabled(True)
+        QMessageBox.critical(self, "Ошибка вычислений",
+                             f"Ошибка при расчете сечения Пуанкаре: {message}")
+
+    def solve_chaos_map(self):
+        """Расчет карты FLI и MEGNO по (x₀, v₀) около текущих начальных условий
+
+        Карта сохраняется в каталоге кэша; повторный запрос с теми же
+        параметрами читает готовые фрагменты вместо расчета.
+        """
+        x0, v0 = self.x0_input.value(), self.v0_input.value()
+        half = self.CHAOS_MAP_HALF_WIDTH
+        parameters = dict(
+            mu=self.mu_input.value(),
+            x0_values=np.linspace(x0 - half, x0 + half, self.CHAOS_MAP_SIZE),
+            second_values=np.linspace(v0 - half, v0 + half, self.CHAOS_MAP_SIZE),
+            t_max=self.time_input.value(),
+            chunk_size=self.CHAOS_MAP_CHUNK
+        )
+        output_dir = os.path.join(
+            os.path.expanduser('~'), '.cache', 'RestrictedThreeBodyProblemApp',
+            'chaos_maps', ChaosMap.digest(**parameters))
+        chaos_map = ChaosMap(output_dir, **parameters)
+
+        def compute(progress):
+            chaos_map.run(progress=progress)
+            return chaos_map.load()
+
+        self.chaos_run_id += 1
+        self.start_task(self.chaos_run_id, compute, (), self.on_chaos_map_finished,
+                        self.on_chaos_map_failed, self.on_chaos_map_progress)
+        self.chaos_button.setEnabled(False)
+
+    def on_chaos_map_progress(self, run_id, fraction):
+        if run_id == self.chaos_run_id:
+            self.chaos_button.setText(f"Карта хаоса: {fraction:.0%}")
+
+    def on_chaos_map_finished(self, run_id, result):
+        if run_id != self.chaos_run_id:
+            return
+        self.chaos_button.setEnabled(True)
+        self.chaos_button.setText("Построить карту хаоса (FLI, MEGNO)")
+        if self.chaos_window is None:
+            self.chaos_window = ChaosMapWindow()
+        self.chaos_window.plot_map(result)
+        self.chaos_window.show()
+
+    def on_chaos_map_failed(self, run_id, message):
+        if run_id != self.chaos_run_id:
+            return
+        self.chaos_button.setEnabled(True)
+        self.chaos_button.setText("Построить карту хаоса (FLI, MEGNO)")
+        QMessageBox.critical(self, "Ошибка вычислений",
+                             f"Ошибка при расчете карты хаоса: {message}")
+
+    def start_task(self, run_id, task, args, on_finished, on_failed, on_progress=None):
+        """Запуск долгой задачи (см. TaskWorker) в отдельном потоке"""
+        worker = TaskWorker(run_id, task, *args)
+        thread = QThread(self)
+        worker.moveToThread(thread)
+
+        thread.started.connect(worker.run)
+        worker.finished.connect(on_finished)
+        worker.failed.connect(on_failed)
+        if on_progress is not None:
+            worker.progress.connect(on_progress)
+        for signal in (worker.finished, worker.failed, worker.cancelled):
+            signal.connect(thread.quit)
+        thread.finished.connect(lambda: self.forget_solver_thread(thread))
+        self.solver_threads.append((worker, thread))
+        thread.start()
+
+    def closeEvent(self, event):
+        """Остановка фоновых потоков при закрытии окна"""
+        self.cancel_solving()
+        for worker, thread in list(self.solver_threads):
+            worker.cancel()
+            thread.quit()
+            thread.wait()
+        super().closeEvent(event)
+
 
 def main():
+    # Профилирование фаз решения: статистика cProfile сохраняется в каталог,
+    # заданный переменной окружения R3BP_PROFILE_DIR
+    profile_dir = os.environ.get('R3BP_PROFILE_DIR')
+    if profile_dir:
+        add_hook(ProfileHook(profile_dir))
+
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()
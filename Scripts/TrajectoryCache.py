@@ -0,0 +1,293 @@
+import glob
+import hashlib
+import json
+import math
+import os
+from collections import OrderedDict
+
+import numpy as np
+from scipy.optimize import OptimizeResult
+from MethodsForSolving import ThreeBodySolver
+
+
+def _hex(value):
+    """Точное текстовое представление числа для ключа кэша"""
+    return float(value).hex()
+
+
+class TrajectoryCache:
+    """Кэш решений solve_system с адресацией по содержимому
+
+    Ключ строится по начальным условиям, μ, методу, интервалу, сетке t_eval
+    и допускам. Решения хранятся в памяти (LRU с ограничением объема) и,
+    если задан cache_dir, на диске в файлах .npy, которые читаются через
+    отображение в память. Решение на более длинном интервале может быть
+    получено продолжением сохраненного более короткого, если все точки
+    t_eval до конца сохраненного решения есть среди его точек. Для сеток
+    np.linspace с разными концами это не выполняется, поэтому продолжение
+    возможно только на сетках с постоянным шагом (fixed_step_grid).
+    """
+
+    def __init__(self, solver=None, cache_dir=None, max_memory_bytes=256 * 2 ** 20,
+                 max_disk_bytes=2 * 2 ** 30):
+        self.solver = solver or ThreeBodySolver()
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory = OrderedDict()  # ключ -> запись
+        self._memory_bytes = 0
+        self._families = {}  # ключ семейства -> {ключ: t_end}
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            for meta_path in glob.glob(os.path.join(cache_dir, '*.json')):
+                try:
+                    with open(meta_path, encoding='utf-8') as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                self._remember_family(meta['family'], meta['key'], meta['t_end'])
+
+    @staticmethod
+    def family_key(init_states, method, t0, mu, rtol, atol):
+        """Ключ семейства решений, отличающихся только концом интервала"""
+        parts = [method, _hex(t0), _hex(mu), _hex(rtol), _hex(atol)]
+        parts += [_hex(value) for value in init_states]
+        return hashlib.sha256('|'.join(parts).encode()).hexdigest()
+
+    @staticmethod
+    def fixed_step_grid(t_span, n_points):
+        """Сетка t_eval с шагом вида 2ᵏ
+
+        Шаг - ближайшая сверху к (t₁ - t₀)/(n_points - 1) степень двойки,
+        поэтому точек не больше n_points (и больше n_points/2). Такие шаги кратны друг
+        другу, и точки сетки для большего t₁ до конца более короткого
+        решения есть среди его точек, так что оно продолжается (find_prefix).
+        Последний узел - t₁.
+        """
+        t0, t1 = float(t_span[0]), float(t_span[1])
+        raw = (t1 - t0) / max(int(n_points) - 1, 1)
+        dt = 2.0 ** math.ceil(math.log2(raw))
+
+        n_steps = math.floor((t1 - t0) / dt + 1e-9)
+        t_eval = t0 + dt * np.arange(n_steps + 1)
+        if t1 - t_eval[-1] > 1e-9 * dt:
+            t_eval = np.append(t_eval, t1)
+        t_eval[-1] = t1
+        return t_eval
+
+    @staticmethod
+    def make_key(init_states, method, t_span, t_eval, mu, rtol, atol):
+        """Ключ конкретного решения"""
+        family = TrajectoryCache.family_key(init_states, method, t_span[0], mu, rtol, atol)
+        digest = hashlib.sha256(family.encode())
+        digest.update(_hex(t_span[1]).encode())
+        digest.update(np.ascontiguousarray(t_eval, dtype=float).tobytes())
+        return digest.hexdigest()
+
+    def get(self, init_states, method, t_span, t_eval, mu,
+            rtol=ThreeBodySolver.RTOL, atol=ThreeBodySolver.ATOL):
+        """Решение из кэша или None, если оно не сохранялось"""
+        key = self.make_key(init_states, method, t_span, t_eval, mu, rtol, atol)
+        entry = self._load(key)
+        return None if entry is None else self._as_result(entry)
+
+    def put(self, sol, init_states, method, t_span, t_eval, mu,
+            rtol=ThreeBodySolver.RTOL, atol=ThreeBodySolver.ATOL):
+        """Сохранение успешного решения в кэш"""
+        if not sol.success:
+            return
+        family = self.family_key(init_states, method, t_span[0], mu, rtol, atol)
+        key = self.make_key(init_states, method, t_span, t_eval, mu, rtol, atol)
+
+        # Конечное состояние известно, только если последняя точка сетки
+        # совпадает с концом интервала; без него продолжение невозможно
+        t = np.asarray(sol.t, dtype=float)
+        y = np.asarray(sol.y, dtype=float)
+        y_end = y[:, -1].tolist() if t.size and t[-1] == t_span[1] else None
+
+        entry = {'key': key, 'family': family, 't_end': float(t_span[1]),
+                 'y_end': y_end, 't': t, 'y': y}
+        self._store_memory(entry)
+        if self.cache_dir is not None:
+            self._store_disk(entry)
+        self._remember_family(family, key, entry['t_end'])
+
+    def solve(self, init_states, method, t_span, t_eval, mu,
+              rtol=ThreeBodySolver.RTOL, atol=ThreeBodySolver.ATOL):
+        """Решение с использованием кэша
+
+        Порядок поиска: точное совпадение, продолжение более короткого
+        сохраненного решения, полное решение через solve_system.
+        У результата атрибут cache равен 'hit', 'extended' или 'miss'.
+        """
+        t_eval = np.asarray(t_eval, dtype=float)
+        sol = self.get(init_states, method, t_span, t_eval, mu, rtol, atol)
+        if sol is not None:
+            sol.cache = 'hit'
+            return sol
+
+        sol = self._extend(init_states, method, t_span, t_eval, mu, rtol, atol)
+        if sol is None:
+            sol = self.solver.solve_system(init_states, method, t_span, t_eval,
+                                           mu, rtol, atol)
+            sol.cache = 'miss'
+        self.put(sol, init_states, method, t_span, t_eval, mu, rtol, atol)
+        return sol
+
+    def clear_memory(self):
+        """Очистка уровня кэша в памяти"""
+        self._memory.clear()
+        self._memory_bytes = 0
+
+    def find_prefix(self, init_states, method, t_span, t_eval, mu,
+                    rtol=ThreeBodySolver.RTOL, atol=ThreeBodySolver.ATOL):
+        """Самое длинное сохраненное решение, которое можно продолжить до t_span[1]
+
+        Точки t_eval до конца сохраненного решения должны быть среди его
+        точек (не обязательно всеми ими), см. fixed_step_grid.
+
+        Returns:
+            OptimizeResult с точками t, y сохраненного решения, попавшими в
+            t_eval, его концом t_end и состоянием в нем y_end, а также
+            n_prefix - числом первых точек t_eval, уже имеющихся в решении;
+            None, если подходящего решения нет
+        """
+        t_eval = np.asarray(t_eval, dtype=float)
+        family = self.family_key(init_states, method, t_span[0], mu, rtol, atol)
+        candidates = sorted(self._families.get(family, {}).items(),
+                            key=lambda item: item[1], reverse=True)
+
+        for key, t_end in candidates:
+            if t_end >= t_span[1]:
+                continue
+            entry = self._load(key)
+            if entry is None or entry['y_end'] is None:
+                continue
+
+            # Точки запроса до t_end ищутся среди точек сохраненного решения
+            tolerance = 1e-12 * max(abs(t_end), 1.0)
+            n_prefix = int(np.searchsorted(t_eval, t_end + tolerance, side='right'))
+            stored_t = entry['t']
+            index = np.searchsorted(stored_t, t_eval[:n_prefix] - tolerance)
+            if index.size and index[-1] >= stored_t.size:
+                continue
+            if not np.allclose(stored_t[index], t_eval[:n_prefix], rtol=0, atol=tolerance):
+                continue
+            return OptimizeResult(t=stored_t[index], y=entry['y'][:, index], t_end=t_end,
+                                  y_end=entry['y_end'], n_prefix=n_prefix)
+        return None
+
+    @staticmethod
+    def splice(prefix, tail):
+        """Решение из сохраненной части (find_prefix) и ее продолжения tail"""
+        return OptimizeResult(
+            dict(tail, t=np.concatenate((prefix.t, tail.t)),
+                 y=np.concatenate((prefix.y, tail.y), axis=1), cache='extended')
+        )
+
+    def _extend(self, init_states, method, t_span, t_eval, mu, rtol, atol):
+        """Продолжение сохраненного решения на более длинный интервал"""
+        prefix = self.find_prefix(init_states, method, t_span, t_eval, mu, rtol, atol)
+        if prefix is None:
+            return None
+        tail = self.solver.solve_system(prefix.y_end, method, (prefix.t_end, t_span[1]),
+                                        t_eval[prefix.n_prefix:], mu, rtol, atol)
+        if not tail.success:
+            return None
+        return self.splice(prefix, tail)
+
+    def _load(self, key):
+        """Поиск записи в памяти, затем на диске"""
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+        if self.cache_dir is None:
+            return None
+
+        base = os.path.join(self.cache_dir, key)
+        try:
+            with open(base + '.json', encoding='utf-8') as f:
+                meta = json.load(f)
+            t = np.load(base + '.t.npy', mmap_mode='r')
+            y = np.load(base + '.y.npy', mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        os.utime(base + '.json')
+
+        entry = dict(meta, t=t, y=y)
+        self._store_memory(entry)
+        return entry
+
+    def _store_memory(self, entry):
+        """Добавление записи в LRU в памяти с вытеснением старых"""
+        key = entry['key']
+        self._forget_memory(key)
+        self._memory[key] = entry
+        self._memory_bytes += self._entry_bytes(entry)
+
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, old = self._memory.popitem(last=False)
+            self._memory_bytes -= self._entry_bytes(old)
+
+    def _forget_memory(self, key):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= self._entry_bytes(entry)
+
+    @staticmethod
+    def _entry_bytes(entry):
+        # Отображенные в память массивы не занимают оперативную память
+        return sum(a.nbytes for a in (entry['t'], entry['y'])
+                   if not isinstance(a, np.memmap))
+
+    def _store_disk(self, entry):
+        """Запись решения на диск; файл .json пишется последним"""
+        base = os.path.join(self.cache_dir, entry['key'])
+        for suffix, array in (('.t.npy', entry['t']), ('.y.npy', entry['y'])):
+            with open(base + suffix + '.tmp', 'wb') as f:
+                np.save(f, array)
+            os.replace(base + suffix + '.tmp', base + suffix)
+
+        meta = {name: entry[name] for name in ('key', 'family', 't_end', 'y_end')}
+        with open(base + '.json.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(base + '.json.tmp', base + '.json')
+        self._trim_disk()
+
+    def _trim_disk(self):
+        """Удаление давно не использованных решений сверх max_disk_bytes"""
+        metas = glob.glob(os.path.join(self.cache_dir, '*.json'))
+        files = []
+        for meta_path in metas:
+            base = meta_path[:-len('.json')]
+            try:
+                size = sum(os.path.getsize(base + s) for s in ('.json', '.t.npy', '.y.npy'))
+                files.append((os.path.getmtime(meta_path), size, base))
+            except OSError:
+                continue
+
+        total = sum(size for _, size, _ in files)
+        for _, size, base in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            key = os.path.basename(base)
+            for suffix in ('.json', '.t.npy', '.y.npy'):
+                try:
+                    os.remove(base + suffix)
+                except OSError:
+                    pass
+            self._forget_memory(key)
+            for family in self._families.values():
+                family.pop(key, None)
+            total -= size
+
+    def _remember_family(self, family, key, t_end):
+        self._families.setdefault(family, {})[key] = t_end
+
+    @staticmethod
+    def _as_result(entry):
+        return OptimizeResult(t=entry['t'], y=entry['y'], success=True, status=0,
+                              message="Решение взято из кэша", nfev=0, njev=0, nlu=0)
@@ -0,0 +1,152 @@
+import json
+import struct
+
+import numpy as np
+
+
+MAGIC = b'R3BPTRJ1'
+INDEX_SUFFIX = '.idx'
+
+# Запись оглавления: номер первой записи фрагмента, число записей, t начала и конца
+INDEX_DTYPE = np.dtype([('first', '<i8'), ('count', '<i8'),
+                        ('t_start', '<f8'), ('t_end', '<f8')])
+
+
+def record_dtype(single_precision):
+    """Тип записи файла: время всегда float64, состояние - float32 или float64"""
+    state = '<f4' if single_precision else '<f8'
+    return np.dtype([('t', '<f8'), ('state', state, (4,))])
+
+
+class TrajectoryWriter:
+    """Потоковая запись траектории в файл с дозаписью фрагментов
+
+    Файл состоит из заголовка с метаданными (JSON) и непрерывной
+    последовательности записей (t, x, y, u, v). Рядом пишется оглавление
+    <path>.idx с диапазоном времени каждого фрагмента. Оглавление
+    дополняется после записи данных, поэтому при аварийном завершении
+    файл остается читаемым до последнего полностью записанного фрагмента.
+    """
+
+    def __init__(self, path, metadata, single_precision=False):
+        self.path = path
+        self.dtype = record_dtype(single_precision)
+        self.count = 0
+
+        metadata = dict(metadata, dtype=self.dtype['state'].base.name)
+        header = json.dumps(metadata).encode('utf-8')
+        # Выравнивание начала данных по 8 байт
+        header += b' ' * (-(len(MAGIC) + 4 + len(header)) % 8)
+
+        self._data = open(path, 'wb')
+        self._data.write(MAGIC + struct.pack('<I', len(header)) + header)
+        self._data.flush()
+        self._index = open(path + INDEX_SUFFIX, 'wb')
+
+    def append(self, t, y):
+        """Дозапись фрагмента: t формы (n,), y формы (4, n)"""
+        t = np.asarray(t, dtype=float)
+        if t.size == 0:
+            return
+        records = np.empty(t.size, dtype=self.dtype)
+        records['t'] = t
+        records['state'] = np.asarray(y).T
+
+        self._data.write(records.tobytes())
+        self._data.flush()
+
+        entry = np.array([(self.count, t.size, t[0], t[-1])], dtype=INDEX_DTYPE)
+        self._index.write(entry.tobytes())
+        self._index.flush()
+        self.count += t.size
+
+    def close(self):
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class StoredTrajectory:
+    """Траектория, открытая из файла через отображение в память
+
+    Атрибуты t (n,) и y (4, n) - представления файла без копирования,
+    поэтому объект можно передавать в OrbitPlotWindow.plot_orbit вместо
+    результата solve_ivp.
+    """
+
+    success = True
+    status = 0
+    message = "Траектория загружена из файла"
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} не является файлом траектории")
+            header_len, = struct.unpack('<I', f.read(4))
+            self.metadata = json.loads(f.read(header_len).decode('utf-8'))
+        data_offset = len(MAGIC) + 4 + header_len
+
+        self.chunks = np.fromfile(path + INDEX_SUFFIX, dtype=INDEX_DTYPE)
+        dtype = record_dtype(self.metadata['dtype'] == 'float32')
+        n = int(self.chunks['count'].sum())
+
+        if n:
+            self._map = np.memmap(path, dtype=np.uint8, mode='r',
+                                  offset=data_offset, shape=(n * dtype.itemsize,))
+            state = dtype['state'].base
+            self.t = np.ndarray((n,), dtype='<f8', buffer=self._map,
+                                strides=(dtype.itemsize,))
+            self.y = np.ndarray((4, n), dtype=state, buffer=self._map,
+                                offset=dtype.fields['state'][1],
+                                strides=(state.itemsize, dtype.itemsize))
+        else:
+            self._map = None
+            self.t = np.empty(0)
+            self.y = np.empty((4, 0))
+
+    @property
+    def mu(self):
+        return self.metadata.get('mu')
+
+    @property
+    def method(self):
+        return self.metadata.get('method')
+
+    @property
+    def init_states(self):
+        return self.metadata.get('init_states')
+
+    def __len__(self):
+        return self.t.size
+
+    def chunk(self, i):
+        """Фрагмент i в том виде, в каком он был записан: (t, y)"""
+        first, count = int(self.chunks['first'][i]), int(self.chunks['count'][i])
+        return self.t[first:first + count], self.y[:, first:first + count]
+
+    def window(self, t_start, t_stop):
+        """Точки с t_start <= t <= t_stop без копирования данных
+
+        Нужные фрагменты находятся по оглавлению, поэтому читаются только
+        страницы файла, относящиеся к окну.
+        """
+        if not len(self):
+            return self.t, self.y
+        first_chunk = np.searchsorted(self.chunks['t_end'], t_start, side='left')
+        last_chunk = np.searchsorted(self.chunks['t_start'], t_stop, side='right')
+        if first_chunk >= last_chunk:
+            return self.t[:0], self.y[:, :0]
+
+        lo = int(self.chunks['first'][first_chunk])
+        hi = int(self.chunks['first'][last_chunk - 1] + self.chunks['count'][last_chunk - 1])
+        t = self.t[lo:hi]
+        begin = lo + np.searchsorted(t, t_start, side='left')
+        end = lo + np.searchsorted(t, t_stop, side='right')
+        return self.t[begin:end], self.y[:, begin:end]
+